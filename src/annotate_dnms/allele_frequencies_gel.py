@@ -0,0 +1,161 @@
+"""Extract GEL allele frequencies at DNM sites.
+
+Each aggV2 allele frequency file is streamed once, in chunks, in its own worker
+process. Only rows matching a DNM site are kept, so memory scales with the
+number of DNMs rather than the genome. The matches are sorted by coordinate,
+bgzipped and tabix-indexed for `bcftools annotate`.
+"""
+
+import concurrent.futures
+import gzip
+import logging
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pysam
+
+import src
+
+_DIR = "/gel_data_resources/main_programme/aggregation/aggregate_gVCF_strelka/aggV2/additional_data/allele_frequencies/"
+_DNMS = "data/interim/dnms_38_combined.vcf.gz"
+_FILE_OUT = "data/interim/allele_frequencies_gel.txt.gz"
+_USECOLS = [0, 1, 2, 3, 27, 28, 29]  # CHROM, POS, REF, ALT, AC, AN, AF
+_NAMES = ["chr", "pos", "ref", "alt", "ac_gel", "an_gel", "af_gel"]
+_SITES = ["chr", "pos", "ref", "alt"]
+_CHUNK_SIZE = 500_000
+_WORKERS = 8
+
+logger = logging.getLogger(__name__)
+
+_worker = {}
+
+
+def read_dnm_sites(path):
+    """Unique DNM sites in coordinate order, and the contigs in header order."""
+
+    with pysam.VariantFile(path) as vcf:
+        contigs = list(vcf.header.contigs)
+        sites = [
+            (r.chrom, r.pos, r.ref, alt) for r in vcf.fetch() for alt in r.alts or []
+        ]
+
+    df = pd.DataFrame(sites, columns=_SITES).drop_duplicates()
+    contigs += [c for c in df["chr"].unique() if c not in contigs]
+    df = sort_sites(df, contigs)
+
+    logger.info(f"DNM sites: {len(df)}")
+
+    return df, contigs
+
+
+def get_keys(chrom, pos, contigs):
+    """Integer keys of (contig, position). Unknown contigs have negative keys."""
+
+    codes = pd.Categorical(chrom, categories=contigs).codes.astype(np.int64)
+    return np.where(codes >= 0, codes * 2**32 + np.asarray(pos, dtype=np.int64), -1)
+
+
+def sort_sites(df, contigs):
+    keys = get_keys(df["chr"], df["pos"], contigs)
+    return df.iloc[np.argsort(keys, kind="stable")].reset_index(drop=True)
+
+
+def version_key(path):
+    """Sort key of a path, in version order as `sort -V`."""
+
+    return [int(p) if p.isdigit() else p for p in re.split(r"(\d+)", str(path))]
+
+
+def list_files(directory):
+    return sorted(Path(directory).rglob("*.tsv.gz"), key=version_key)
+
+
+def count_header_lines(path):
+    with gzip.open(path, "rt") as f:
+        n = 0
+        for line in f:
+            if not line.startswith("#"):
+                break
+            n += 1
+
+    return n
+
+
+def init_worker(sites, contigs):
+    _worker["sites"] = sites
+    _worker["contigs"] = contigs
+    _worker["keys"] = np.unique(get_keys(sites["chr"], sites["pos"], contigs))
+
+
+def extract_file(path, chunk_size=_CHUNK_SIZE):
+    """Rows of one allele frequency file which match a DNM site."""
+
+    sites, contigs, keys = _worker["sites"], _worker["contigs"], _worker["keys"]
+    chunks = pd.read_csv(
+        path,
+        sep="\t",
+        header=None,
+        skiprows=count_header_lines(path),
+        usecols=_USECOLS,
+        dtype=str,
+        chunksize=chunk_size,
+    )
+
+    matches = []
+    for chunk in chunks:
+        chunk.columns = _NAMES
+        chunk = chunk.astype({"pos": np.int64})
+        hit = np.isin(get_keys(chunk["chr"], chunk["pos"], contigs), keys)
+        matches.append(chunk[hit].merge(sites, how="inner", on=_SITES))
+
+    df = pd.concat(matches, ignore_index=True)
+
+    logger.info(f"{Path(path).name}: {len(df)} matching rows")
+
+    return df
+
+
+def extract_all(sites, contigs, paths, workers=_WORKERS):
+    """Matching rows from every file, one file per worker, in file order."""
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(sites, contigs)
+    ) as executor:
+        matches = list(executor.map(extract_file, paths))
+
+    df = pd.concat(matches, ignore_index=True).pipe(sort_sites, contigs)
+
+    logger.info(f"Rows matching a DNM site: {len(df)}")
+    logger.info(
+        f"DNM sites with a GEL allele frequency: {len(df[_SITES].drop_duplicates())}"
+    )
+
+    return df
+
+
+def write_out(df, path):
+    """Write a bgzipped, tabix-indexed TSV without a header."""
+
+    plain = str(Path(path).with_suffix(""))
+    df.to_csv(plain, sep="\t", header=False, index=False)
+    pysam.tabix_index(plain, force=True, seq_col=0, start_col=1, end_col=1)
+
+    return df
+
+
+def main():
+    """Run as script."""
+
+    sites, contigs = read_dnm_sites(_DNMS)
+    paths = list_files(_DIR)
+
+    logger.info(f"Allele frequency files: {len(paths)}")
+
+    return extract_all(sites, contigs, paths).pipe(write_out, _FILE_OUT)
+
+
+if __name__ == "__main__":
+    logger = src.setup_logger(src.log_file(__file__))
+    main()
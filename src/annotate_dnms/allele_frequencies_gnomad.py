@@ -0,0 +1,131 @@
+"""Extract gnomAD allele frequencies at DNM sites.
+
+Each indexed gnomAD chunk is queried only at DNM positions, in a worker pool.
+Sites filtered as AC0 are dropped, and only the AC, AN and AF annotations are
+kept. Each chunk gives a coordinate-sorted stream of records, so the streams
+are merged straight into the bgzipped, indexed output without re-sorting.
+"""
+
+import concurrent.futures
+import heapq
+import logging
+from pathlib import Path
+
+import pysam
+
+import src
+from src.annotate_dnms import allele_frequencies_gel as afg
+
+_DIR = "/public_data_resources/gnomad/v3.1.1/vcf/"
+_DNMS = "data/interim/dnms_38_combined.vcf.gz"
+_FILE_OUT = "data/interim/allele_frequencies_gnomad_v3.1.1_genomes.vcf.gz"
+_INFO = ["AC", "AN", "AF"]
+_WORKERS = 8
+
+logger = logging.getLogger(__name__)
+
+_worker = {}
+
+
+def get_positions(sites):
+    """Unique DNM positions per contig, in coordinate order."""
+
+    return {c: sorted(set(pos)) for c, pos in sites.groupby("chr")["pos"]}
+
+
+def list_files(directory):
+    paths = sorted(Path(directory).rglob("*.vcf.bgz"), key=afg.version_key)
+    return [str(p) for p in paths]
+
+
+def tidy_header(header, keep=_INFO):
+    """Header text with only the kept INFO definitions."""
+
+    def is_kept(line):
+        return not line.startswith("##INFO") or line[11:].split(",")[0] in keep
+
+    return "".join(filter(is_kept, str(header).splitlines(keepends=True)))
+
+
+def tidy_record(record, keep=_INFO):
+    """VCF line of a record with only the kept INFO fields, as in the source."""
+
+    fields = str(record).rstrip("\n").split("\t")[:8]
+    info = [f for f in fields[7].split(";") if f.split("=")[0] in keep]
+    fields[7] = ";".join(info) or "."
+
+    return "\t".join(fields) + "\n"
+
+
+def init_worker(positions, contigs):
+    _worker["positions"] = positions
+    _worker["codes"] = {c: i for i, c in enumerate(contigs)}
+
+
+def extract_file(path):
+    """Records of one chunk at DNM positions, sorted by (contig, position)."""
+
+    positions, codes = _worker["positions"], _worker["codes"]
+    records = []
+
+    with pysam.VariantFile(path) as vcf:
+        for contig in sorted(set(vcf.index) & set(positions), key=codes.get):
+            for pos in positions[contig]:
+                for record in vcf.fetch(contig, pos - 1, pos):
+                    if record.pos != pos or "AC0" in record.filter:
+                        continue
+                    records.append((codes[contig], pos, tidy_record(record)))
+
+    logger.info(f"{Path(path).name}: {len(records)} records at DNM sites")
+
+    return records
+
+
+def extract_all(positions, contigs, paths, workers=_WORKERS):
+    """Merge the sorted records of every chunk, extracted in a worker pool."""
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(positions, contigs)
+    ) as executor:
+        streams = list(executor.map(extract_file, paths))
+
+    return heapq.merge(*streams, key=lambda r: r[:2])
+
+
+def write_out(header, records, path):
+    """Write a bgzipped, tabix-indexed VCF."""
+
+    n = 0
+    with pysam.BGZFile(path, "wb") as f:
+        f.write(header.encode())
+        for *_, line in records:
+            f.write(line.encode())
+            n += 1
+
+    pysam.tabix_index(path, force=True, preset="vcf")
+
+    logger.info(f"Records written: {n}")
+
+    return path
+
+
+def main():
+    """Run as script."""
+
+    sites, contigs = afg.read_dnm_sites(_DNMS)
+    positions = get_positions(sites)
+    paths = list_files(_DIR)
+
+    logger.info(f"gnomAD chunks: {len(paths)}")
+
+    with pysam.VariantFile(paths[0]) as vcf:
+        header = tidy_header(vcf.header)
+
+    records = extract_all(positions, contigs, paths)
+
+    return write_out(header, records, _FILE_OUT)
+
+
+if __name__ == "__main__":
+    logger = src.setup_logger(src.log_file(__file__))
+    main()
@@ -0,0 +1,218 @@
+"""Persistent store of GEL and gnomAD allele frequencies at DNM sites.
+
+Variants are packed into 64-bit keys with `VariantKeys`, so that keys sort in
+coordinate order. The side table of hashed allele codes, in which hash
+collisions are resolved, is saved with the store and shared by its sources, so
+that keys are stable between runs. Each source is a directory of .npy arrays:
+sorted keys, with parallel AC, AN and AF arrays, and the sorted keys of every
+site which has been queried. Arrays are memory-mapped, and looked up in batches
+with `np.searchsorted`.
+
+Only DNM sites which have not yet been queried are extracted from the raw
+sources, and added to the store.
+"""
+
+import collections
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import src
+from src import variant_keys
+from src.annotate_dnms import allele_frequencies_gel as afg
+from src.annotate_dnms import allele_frequencies_gnomad as afn
+
+_DNMS = "data/interim/dnms_38_combined.vcf.gz"
+_STORE = "data/interim/allele_frequency_store"
+_ALLELES = "alleles.json"
+_AF_TYPES = {"ac": np.int64, "an": np.int64, "af": np.float64}
+_ARRAYS = ["keys", "ac", "an", "af", "queried"]
+
+Source = collections.namedtuple("Source", _ARRAYS)
+
+logger = logging.getLogger(__name__)
+
+
+def read_encoder(directory=_STORE):
+    """Key encoder with the hashed allele codes of the store."""
+
+    path = Path(directory) / _ALLELES
+    if not path.exists():
+        return variant_keys.VariantKeys()
+
+    with open(path) as f:
+        return variant_keys.VariantKeys(json.load(f))
+
+
+def write_encoder(encoder, directory=_STORE):
+    path = Path(directory) / _ALLELES
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp = path.with_suffix(".tmp.json")
+    with open(tmp, "w") as f:
+        json.dump(encoder.codes, f)
+    os.replace(tmp, path)
+
+    return encoder
+
+
+def site_keys(df, encoder):
+    return encoder.encode(df.astype({"pos": np.int64}))
+
+
+def empty_source():
+    return Source(
+        keys=np.empty(0, dtype=np.int64),
+        ac=np.empty(0, dtype=np.int64),
+        an=np.empty(0, dtype=np.int64),
+        af=np.empty(0, dtype=np.float64),
+        queried=np.empty(0, dtype=np.int64),
+    )
+
+
+def read_source(name, directory=_STORE):
+    """Memory-map the arrays of one source, or return an empty source."""
+
+    path = Path(directory) / name
+    if not (path / "queried.npy").exists():
+        return empty_source()
+
+    return Source(*[np.load(path / f"{a}.npy", mmap_mode="r") for a in _ARRAYS])
+
+
+def write_source(source, name, directory=_STORE):
+    path = Path(directory) / name
+    path.mkdir(parents=True, exist_ok=True)
+
+    for array, values in source._asdict().items():
+        tmp = path / f"{array}.tmp.npy"
+        np.save(tmp, values)
+        os.replace(tmp, path / f"{array}.npy")
+
+    logger.info(f"{name}: {len(source.keys)} variants, {len(source.queried)} queried")
+
+    return source
+
+
+def contains(sorted_keys, keys):
+    """Whether each key is in a sorted array of keys."""
+
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=bool)
+
+    i = np.searchsorted(sorted_keys, keys).clip(max=len(sorted_keys) - 1)
+
+    return sorted_keys[i] == keys
+
+
+def lookup(source, keys):
+    """AC, AN and AF of each key, or NaN for variants not in the source."""
+
+    keys = np.asarray(keys, dtype=np.int64)
+    found = contains(source.keys, keys)
+    i = np.searchsorted(source.keys, keys[found])
+
+    df = pd.DataFrame(np.nan, index=range(len(keys)), columns=["ac", "an", "af"])
+    for column in df:
+        df.loc[found, column] = getattr(source, column)[i]
+
+    return df
+
+
+def add_sites(source, queried, found, encoder):
+    """Add queried keys, and the AFs of variants found in the raw source."""
+
+    keys = np.concatenate([source.keys, site_keys(found, encoder)])
+    keys, first = np.unique(keys, return_index=True)
+
+    def merge(old, column, dtype):
+        return np.concatenate([old, found[column].to_numpy(dtype=dtype)])[first]
+
+    return Source(
+        keys=keys,
+        ac=merge(source.ac, "ac", np.int64),
+        an=merge(source.an, "an", np.int64),
+        af=merge(source.af, "af", np.float64),
+        queried=np.union1d(source.queried, queried),
+    )
+
+
+def extract_gel(sites, contigs):
+    df = afg.extract_all(sites, contigs, afg.list_files(afg._DIR))
+    return df.rename(columns=lambda c: c.replace("_gel", ""))
+
+
+def parse_records(records):
+    """AC, AN and AF of tidied gnomAD VCF lines, one row per ALT allele."""
+
+    rows = []
+    for *_, line in records:
+        chrom, pos, _, ref, alts, _, _, info = line.rstrip("\n").split("\t")
+        info = dict(f.split("=") for f in info.split(";"))
+        for alt, ac, af in zip(
+            alts.split(","), info["AC"].split(","), info["AF"].split(",")
+        ):
+            rows.append((chrom, int(pos), ref, alt, ac, info["AN"], af))
+
+    return pd.DataFrame(rows, columns=["chr", "pos", "ref", "alt", "ac", "an", "af"])
+
+
+def extract_gnomad(sites, contigs):
+    positions = afn.get_positions(sites)
+    records = afn.extract_all(positions, contigs, afn.list_files(afn._DIR))
+    return parse_records(records).merge(sites, how="inner")
+
+
+_EXTRACTORS = {"gel": extract_gel, "gnomad": extract_gnomad}
+
+
+def to_numbers(df):
+    """Numeric AC, AN and AF. Variants with a missing value are dropped."""
+
+    df = df.assign(**{c: pd.to_numeric(df[c], errors="coerce") for c in _AF_TYPES})
+    missing = df[list(_AF_TYPES)].isna().any(axis=1)
+
+    logger.info(f"Variants with a missing AC, AN or AF: {missing.sum()}")
+
+    return df[~missing].astype(_AF_TYPES)
+
+
+def add_missing_sites(name, sites, contigs, encoder, directory=_STORE):
+    """Query the raw source at sites not yet in the store, and add them."""
+
+    source = read_source(name, directory)
+    keys = site_keys(sites, encoder)
+    missing = ~contains(source.queried, keys)
+
+    logger.info(f"{name}: {missing.sum()} of {len(sites)} DNM sites not yet queried")
+
+    if not missing.any():
+        return source
+
+    found = _EXTRACTORS[name](sites[missing], contigs).pipe(to_numbers)
+
+    logger.info(f"{name}: {len(found)} variants found in the raw source")
+
+    source = add_sites(source, keys[missing], found, encoder)
+    write_encoder(encoder, directory)  # Before the keys which use its codes
+
+    return write_source(source, name, directory)
+
+
+def main():
+    """Run as script."""
+
+    sites, contigs = afg.read_dnm_sites(_DNMS)
+    encoder = read_encoder()
+
+    for name in _EXTRACTORS:
+        add_missing_sites(name, sites, contigs, encoder)
+
+
+if __name__ == "__main__":
+    logger = src.setup_logger(src.log_file(__file__))
+    main()
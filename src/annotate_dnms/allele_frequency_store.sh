@@ -0,0 +1,16 @@
+#!/usr/bin/env bash
+
+#BSUB -q short
+#BSUB -P re_gecip_enhanced_interpretation
+#BSUB -J "af_store"
+#BSUB -o data/logs/cluster/af_store_%J.out
+#BSUB -e data/logs/cluster/af_store_%J.err
+#BSUB -R "rusage[mem=64000]"
+#BSUB -M 64000
+
+set -euo pipefail
+source activate dnms
+
+# Add GEL and gnomAD allele frequencies at DNM sites missing from the store
+
+python3 -m src.annotate_dnms.allele_frequency_store
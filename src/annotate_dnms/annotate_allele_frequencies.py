@@ -0,0 +1,106 @@
+"""Annotate DNMs with GEL and gnomAD allele frequencies from the AF store."""
+
+import logging
+
+import numpy as np
+import pandas as pd
+import pysam
+
+import src
+from src import metadata
+from src.annotate_dnms import allele_frequency_store as afs
+
+_DNMS = "data/interim/dnms_38_combined.vcf.gz"
+_FILE_OUT = "data/interim/dnms_38_combined_af.vcf.gz"
+_SOURCES = {"gel": "GEL genomes", "gnomad": "gnomAD v3.1.1 genomes"}
+_FIELDS = {
+    "ac": ("Integer", "Allele count"),
+    "an": ("Integer", "Allele number"),
+    "af": ("Float", "Allele frequency"),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def add_header(header):
+    """Copy of a header, with per-ALT INFO lines for each source and field."""
+
+    header = header.copy()
+    for source, label in _SOURCES.items():
+        for field, (dtype, description) in _FIELDS.items():
+            description = f"{description} in {label}"
+            header.info.add(f"{field}_{source}", "A", dtype, description)
+
+    return header
+
+
+def get_frequencies(records):
+    """AFs of each ALT of each record from every source.
+
+    Returns one row per ALT, in order, with the position of its record and
+    columns such as `ac_gel`. Records without an ALT have no rows.
+    """
+
+    sites = pd.DataFrame(
+        [
+            (i, r.chrom, r.pos, r.ref, alt)
+            for i, r in enumerate(records)
+            for alt in r.alts or []
+        ],
+        columns=["record", "chr", "pos", "ref", "alt"],
+    )
+    keys = afs.site_keys(sites, afs.read_encoder())
+
+    return pd.concat(
+        [sites[["record"]]]
+        + [
+            afs.lookup(afs.read_source(s), keys).add_suffix(f"_{s}")
+            for s in _SOURCES
+        ],
+        axis=1,
+    )
+
+
+def annotate(record, frequencies):
+    """Set the AFs of each ALT of a record. Values missing for an ALT are empty."""
+
+    for field, values in frequencies.drop(columns="record").items():
+        if values.isna().all():
+            continue
+        cast = float if field.startswith("af") else int
+        record.info[field] = tuple(None if np.isnan(v) else cast(v) for v in values)
+
+    return record
+
+
+def main():
+    """Run as script."""
+
+    with pysam.VariantFile(_DNMS) as vcf:
+        header = add_header(vcf.header)
+        records = list(vcf.fetch())
+
+    frequencies = get_frequencies(records)
+    by_record = dict(iter(frequencies.groupby("record")))
+
+    logger.info(f"Records without an ALT: {len(records) - len(by_record)}")
+    for column in frequencies.filter(like="ac_"):
+        logger.info(f"DNM ALTs with {column}: {frequencies[column].notna().sum()}")
+
+    meta = metadata.vcf_metadata()
+
+    with pysam.VariantFile(_FILE_OUT, "wz", header=header) as vcf:
+        for i, record in enumerate(records):
+            record.translate(header)
+            if i in by_record:
+                annotate(record, by_record[i])
+            vcf.write(record)
+            meta.add(metadata.record_row(record))
+
+    pysam.tabix_index(_FILE_OUT, force=True, preset="vcf")
+    meta.write(_FILE_OUT)
+
+
+if __name__ == "__main__":
+    logger = src.setup_logger(src.log_file(__file__))
+    main()
@@ -1,14 +1,14 @@
 """Log summary information for tidied DNMs."""
 
 import logging
-from pathlib import Path
 
 import pandas as pd
 
 import src
+from src import metadata
 
 _FILE_IN = "data/interim/dnms_38_combined_af_vep_tidy_dedup.tsv"
-_NAMES = "chr pos ref alt csq enst cohort id".split()
+_NAMES = "chr pos ref alt csq enst cohort id ac_gnomad af_gnomad ac_gel".split()
 
 logger = logging.getLogger(__name__)
 
@@ -22,17 +22,17 @@ def read_tidy_dnms(path=_FILE_IN):
 def main():
     """Run as script."""
 
-    df = read_tidy_dnms(_FILE_IN)
-
-    logger.info(f"DNMs after tidying: {len(df)}")
-    logger.info(f"Unique variants {len(df.drop_duplicates(['chr','pos','ref','alt']))}")
-    logger.info(
-        f"Unique by variant / ID: {len(df.drop_duplicates(['chr','pos','ref','alt','id']))}"
-    )
-    logger.info(f"Consequence value counts:\n{df.csq.value_counts()}")
-    logger.info(f"Cohort value counts:\n{df.cohort.value_counts()}")
-    logger.info(f"Unique identifiers: {len(df[['cohort','id']].drop_duplicates())}")
-    return df
+    meta = metadata.read_metadata(_FILE_IN)
+
+    logger.info(f"DNMs after tidying: {meta['rows']}")
+    logger.info(f"Unique variants {meta['variants']}")
+    logger.info(f"Unique by variant / ID: {meta['variant_ids']}")
+    logger.info(f"Consequence value counts:\n{pd.Series(meta['counts']['csq'])}")
+    logger.info(f"Cohort value counts:\n{pd.Series(meta['counts']['cohort'])}")
+    logger.info(f"Unique identifiers: {meta['ids']}")
+    logger.info(f"Unique identifiers by cohort:\n{pd.Series(meta['ids_by_group'])}")
+
+    return meta
 
 
 if __name__ == "__main__":
@@ -5,9 +5,11 @@ Where a DNV appears both in the DDD and GEL cohorts, drop it from the DDD cohort
 import logging
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
 import src
+from src import metadata, variant_keys
 
 _LOGFILE = f"data/logs/{Path(__file__).stem}.log"
 _FILE_IN = "data/interim/dnms_38_combined_af_vep_tidy.tsv"
@@ -21,7 +23,19 @@ def read_data(path):
         path,
         sep="\t",
         header=None,
-        names=["chr", "pos", "ref", "alt", "csq", "enst", "cohort", "id"],
+        names=[
+            "chr",
+            "pos",
+            "ref",
+            "alt",
+            "csq",
+            "enst",
+            "cohort",
+            "id",
+            "ac_gnomad",
+            "af_gnomad",
+            "ac_gel",
+        ],
     )
 
     logger.info(f"Starting DNMs: {len(df)}")
@@ -30,22 +44,20 @@ def read_data(path):
     return df
 
 
-def get_cohort_dnms(df: pd.DataFrame, cohort: str):
-    return df.loc[df["cohort"] == cohort, ["chr", "pos", "ref", "alt"]]
-
-
 def find_ddd_dnms_in_gel(df):
-    gel = get_cohort_dnms(df, "GEL")
-    ddd = get_cohort_dnms(df, "DDD")
+    """DDD DNMs with the same chr, pos, ref and alt as any GEL DNM."""
 
-    # Find DDD DNMs present in GEL. Keep the original indices of the DDD DNMs.
-    dups = ddd.reset_index().merge(gel, how="inner").set_index("index")
+    keys = variant_keys.VariantKeys().encode(df)
+    ddd = (df["cohort"] == "DDD").to_numpy()
+    gel = (df["cohort"] == "GEL").to_numpy()
 
-    # Drop DDD DNMs with duplicate indices (i.e. with multiple matches in GEL)
-    dups = dups.loc[~dups.index.duplicated(keep="first")]
+    in_gel = np.zeros(len(df), dtype=bool)
+    in_gel[ddd] = variant_keys.isin(keys[ddd], keys[gel])
+    dups = df.loc[in_gel, ["chr", "pos", "ref", "alt"]]
+    n_unique = (~variant_keys.duplicated(keys[in_gel])).sum()
 
     logger.info(f"DDD DNMs present in GEL: {len(dups)}")
-    logger.info(f"DDD DNMs present in GEL (unique): {len(dups.drop_duplicates())}")
+    logger.info(f"DDD DNMs present in GEL (unique): {n_unique}")
 
     return dups
 
@@ -53,6 +65,9 @@ def find_ddd_dnms_in_gel(df):
 def write_out(df, path):
     logger.info("Writing to output.")
     df.to_csv(path, sep="\t", header=False, index=False)
+    metadata.write_metadata(
+        df, path, id_="id", group="cohort", counts=["cohort", "csq"]
+    )
     return df
 
 
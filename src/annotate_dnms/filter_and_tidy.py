@@ -0,0 +1,139 @@
+"""Filter DNMs by allele count, and tidy VEP consequences, cohort and ID.
+
+Records of the VEP-annotated VCF are decoded once, and processed in batches.
+The output is a TSV of chr, pos, ref, alt, csq, enst, cohort and id, followed
+by the ac_gnomad, af_gnomad and ac_gel values (empty if missing), so that other
+thresholds can be evaluated downstream.
+"""
+
+import itertools
+import logging
+
+import pandas as pd
+import pysam
+
+import src
+from src import metadata
+
+_FILE_IN = "data/interim/dnms_38_combined_af_vep.vcf.gz"
+_FILE_OUT = "data/interim/dnms_38_combined_af_vep_tidy.tsv"
+_MAX_AC_GNOMAD = 1
+_MAX_AF_GNOMAD = 0.0001
+_MAX_AC_GEL = 5
+_BATCH_SIZE = 10000
+_FILTERS = ["ac_gnomad", "af_gnomad", "ac_gel"]
+_NAMES = ["chr", "pos", "ref", "alt", "csq", "enst", "cohort", "id"] + _FILTERS
+_NO_COHORT = ("", "")  # Empty cohort and ID fields, as the awk / cut baseline
+_CONSEQUENCES = [  # In order of priority
+    "stop_gained",
+    "frameshift_variant",
+    "missense_variant",
+    "synonymous_variant",
+]
+
+logger = logging.getLogger(__name__)
+
+
+def get_info(record, key):
+    """First value of an INFO field, or None if it is missing."""
+
+    value = record.info.get(key)
+    return value[0] if isinstance(value, tuple) else value
+
+
+def passes_filters(record, limits):
+    """Whether each allele count or frequency is missing or within its limit.
+
+    A limit of None is not applied.
+    """
+
+    for key, limit in limits.items():
+        value = get_info(record, key)
+        if None not in (value, limit) and value > limit:
+            return False
+
+    return True
+
+
+def simplify_consequence(csq):
+    return next((c for c in _CONSEQUENCES if c in csq), csq)
+
+
+def get_cohort(id_):
+    """Cohort and individual ID from the prefix of a DNM ID.
+
+    IDs which match no cohort pattern have empty cohort and ID fields, so that
+    the later columns stay in place.
+    """
+
+    if id_.startswith("GDX"):
+        return "GDX", (id_.split("_") + [""])[1]
+    if id_.startswith("DDD"):
+        return "DDD", id_.replace(".", "_").split("_")[-1]
+    if id_.startswith("RUMC"):
+        return "RUMC", id_.split("_")[-1]
+    if id_[:1] not in "GDX|RUMC":  # As the bracket expression /^[GDX|DDD|RUMC]/
+        return "GEL", id_
+
+    return _NO_COHORT
+
+
+def format_value(value):
+    """Format an INFO value, with floats to single precision as stored."""
+
+    if value is None:
+        return ""
+
+    return f"{value:.7g}" if isinstance(value, float) else str(value)
+
+
+def tidy_record(record):
+    return (
+        record.chrom,
+        str(record.pos),
+        record.ref,
+        ",".join(record.alts or ["."]),
+        simplify_consequence(get_info(record, "Consequence") or "."),
+        get_info(record, "Feature") or ".",
+        *get_cohort(record.id or "."),
+        *[format_value(get_info(record, k)) for k in _FILTERS],
+    )
+
+
+def filter_and_tidy(
+    path_in,
+    path_out,
+    max_ac_gnomad=_MAX_AC_GNOMAD,
+    max_af_gnomad=_MAX_AF_GNOMAD,
+    max_ac_gel=_MAX_AC_GEL,
+    batch_size=_BATCH_SIZE,
+):
+    """Stream records from a VCF, and write the tidied records which pass filters."""
+
+    limits = dict(zip(_FILTERS, [max_ac_gnomad, max_af_gnomad, max_ac_gel]))
+    meta = metadata.Metadata(id_="id", group="cohort", counts=["cohort", "csq"])
+    n_in = 0
+
+    with pysam.VariantFile(path_in) as vcf, open(path_out, "w") as f:
+        records = iter(vcf)
+        while batch := list(itertools.islice(records, batch_size)):
+            rows = [tidy_record(r) for r in batch if passes_filters(r, limits)]
+            f.writelines("\t".join(row) + "\n" for row in rows)
+            meta.update(pd.DataFrame(rows, columns=_NAMES))
+            n_in += len(batch)
+
+    meta.write(path_out)
+
+    logger.info(f"Records in: {n_in}")
+    logger.info(f"Records passing allele count and frequency filters: {meta.rows}")
+
+
+def main():
+    """Run as script."""
+
+    filter_and_tidy(_FILE_IN, _FILE_OUT)
+
+
+if __name__ == "__main__":
+    logger = src.setup_logger(src.log_file(__file__))
+    main()
@@ -2,10 +2,11 @@
 set -euo pipefail
 
 # Annotate DNMs with VEP
+# Usage: vep.sh [input VCF] [output VCF]
 
-DNMS="data/interim/dnms_38_combined_af.vcf.gz"
-FILE_OUT="data/interim/dnms_38_combined_af_vep.vcf.gz"
-VEP_CACHE="/public_data_resources/vep_resources/VEP_105"
+DNMS="${1:-data/interim/dnms_38_combined_af.vcf.gz}"
+FILE_OUT="${2:-data/interim/dnms_38_combined_af_vep.vcf.gz}"
+VEP_CACHE="${VEP_CACHE:-/public_data_resources/vep_resources/VEP_105}"
 FASTA="/public_data_resources/reference/GRCh37/Homo_sapiens.GRCh37.75.dna.primary_assembly.fa"
 
 vep \
@@ -17,7 +18,7 @@ vep \
     --offline \
     --cache \
     --dir_cache ${VEP_CACHE} \
-    --fork 4 \
+    --fork ${VEP_FORK:-4} \
     --buffer_size 10000 \
     --force_overwrite \
     --format vcf \
@@ -0,0 +1,189 @@
+"""Annotate DNMs with VEP, re-using consequences of previously annotated variants.
+
+The cache holds the canonical Consequence, Feature and SYMBOL rows that VEP
+gave for each variant, with one cache file per VEP version and cache path.
+Variants annotated with no matching consequence are recorded with empty
+fields, so that they are not re-annotated. Only variants missing from the
+cache are sent to VEP. The output has one record per cached row of each input
+record, in the order of the input.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pysam
+
+import src
+from src import metadata, variant_keys
+from src.annotate_dnms import vep_scatter
+
+_FILE_IN = "data/interim/dnms_38_combined_af.vcf.gz"
+_FILE_OUT = "data/interim/dnms_38_combined_af_vep.vcf.gz"
+_VEP = ["bash", "src/annotate_dnms/vep.sh"]
+_VEP_VERSION = "105"
+_VEP_CACHE = "/public_data_resources/vep_resources/VEP_105"
+_CACHE_DIR = "data/interim/vep_cache"
+_SCRATCH = "data/scratch"
+_VARIANT = ["chr", "pos", "ref", "alt"]
+_FIELDS = ["Consequence", "Feature", "SYMBOL"]
+
+logger = logging.getLogger(__name__)
+
+
+def cache_path(version=_VEP_VERSION, vep_cache=_VEP_CACHE, directory=_CACHE_DIR):
+    """Cache file for a VEP version and cache path."""
+
+    digest = hashlib.sha256(f"{version}\t{vep_cache}".encode()).hexdigest()[:16]
+    return Path(directory) / f"vep_{version}_{digest}.tsv.gz"
+
+
+def read_cache(path):
+    if not Path(path).exists():
+        return pd.DataFrame(columns=_VARIANT + _FIELDS)
+
+    return pd.read_csv(path, sep="\t", dtype=str, keep_default_na=False).astype(
+        {"pos": np.int64}
+    )
+
+
+def write_cache(df, path):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(path, sep="\t", index=False)
+    return df
+
+
+def get_variant(record):
+    return (record.chrom, record.pos, record.ref, ",".join(record.alts or ["."]))
+
+
+def get_field(record, field):
+    value = record.info.get(field)
+    return ",".join(value) if isinstance(value, tuple) else (value or "")
+
+
+def add_header(header):
+    """Copy of a header, with INFO lines for the split VEP fields."""
+
+    header = header.copy()
+    for field in _FIELDS:
+        if field not in header.info:
+            header.info.add(field, 1, "String", f"The {field} field from INFO/CSQ")
+
+    return header
+
+
+def write_uncached(header, records, path):
+    """Write the first record of each variant to a VCF for VEP."""
+
+    with pysam.VariantFile(path, "wz", header=header) as vcf:
+        for record in records:
+            vcf.write(record)
+
+    pysam.tabix_index(path, force=True, preset="vcf")
+
+
+def read_vep(path):
+    """Canonical consequence rows from split VEP output, in order."""
+
+    with pysam.VariantFile(path) as vcf:
+        rows = [get_variant(r) + tuple(get_field(r, f) for f in _FIELDS) for r in vcf]
+
+    return pd.DataFrame(rows, columns=_VARIANT + _FIELDS)
+
+
+def run_vep(header, records, command=_VEP, vep_cache=_VEP_CACHE):
+    """Annotate records with VEP, and return their consequence rows.
+
+    Records are annotated in concurrent shards (see `vep_scatter`). `command`
+    is called with the input and output VCF paths of each shard. Variants
+    without a matching consequence are given one row of empty fields.
+    """
+
+    Path(_SCRATCH).mkdir(parents=True, exist_ok=True)
+    env = dict(os.environ, VEP_CACHE=vep_cache)
+
+    with tempfile.TemporaryDirectory(dir=_SCRATCH) as scratch:
+        path_in = f"{scratch}/uncached.vcf.gz"
+        path_out = f"{scratch}/uncached_vep.vcf.gz"
+        write_uncached(header, records, path_in)
+        vep_scatter.scatter_gather(path_in, path_out, command, env=env)
+        rows = read_vep(path_out)
+
+    queried = pd.DataFrame([get_variant(r) for r in records], columns=_VARIANT)
+    empty = queried.merge(rows[_VARIANT], how="left", indicator=True)
+    empty = empty.loc[empty["_merge"] == "left_only", _VARIANT].assign(
+        **{f: "" for f in _FIELDS}
+    )
+
+    logger.info(f"Variants annotated by VEP: {len(records)}")
+    logger.info(f"Variants without a canonical consequence: {len(empty)}")
+
+    return pd.concat([rows, empty], ignore_index=True)
+
+
+def annotate(records, cache, path, header):
+    """Write one record per cached row of each record, in order."""
+
+    variants = pd.DataFrame([get_variant(r) for r in records], columns=_VARIANT)
+    encoder = variant_keys.VariantKeys()
+
+    # Cached rows of each record, in cache order
+    left, right = variant_keys.join(encoder.encode(variants), encoder.encode(cache))
+    fields = cache[_FIELDS].to_numpy()
+    meta = metadata.vcf_metadata(counts=["Consequence"])
+
+    with pysam.VariantFile(path, "wz", header=header) as vcf:
+        for i, j in zip(left, right):
+            if not fields[j][0]:
+                continue
+            record = records[i].copy()
+            record.translate(vcf.header)
+            for field, value in zip(_FIELDS, fields[j]):
+                record.info[field] = value
+            vcf.write(record)
+            meta.add(metadata.record_row(record) + (fields[j][0],))
+
+    meta.write(path)
+
+
+def annotate_with_cache(path_in, path_out, path_cache, command=_VEP):
+    """Annotate a VCF with VEP, sending only variants missing from the cache."""
+
+    with pysam.VariantFile(path_in) as vcf:
+        header = vcf.header
+        records = list(vcf)
+
+    cache = read_cache(path_cache)
+    variants = pd.DataFrame([get_variant(r) for r in records], columns=_VARIANT)
+
+    encoder = variant_keys.VariantKeys()
+    keys = encoder.encode(variants)
+    uncached = ~variant_keys.isin(keys, encoder.encode(cache))
+    first = ~variant_keys.duplicated(keys)
+
+    logger.info(f"Records: {len(records)}")
+    logger.info(f"Variants in the cache: {(first & ~uncached).sum()}")
+    logger.info(f"Variants not in the cache: {(first & uncached).sum()}")
+
+    if uncached.any():
+        novel = [records[i] for i in np.flatnonzero(first & uncached)]
+        new = run_vep(header, novel, command)
+        cache = pd.concat([cache, new], ignore_index=True).pipe(write_cache, path_cache)
+
+    annotate(records, cache, path_out, add_header(header))
+
+
+def main():
+    """Run as script."""
+
+    annotate_with_cache(_FILE_IN, _FILE_OUT, cache_path())
+
+
+if __name__ == "__main__":
+    logger = src.setup_logger(src.log_file(__file__))
+    main()
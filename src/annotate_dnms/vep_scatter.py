@@ -0,0 +1,141 @@
+"""Run VEP on shards of a VCF concurrently, and gather the output in order.
+
+The records of a coordinate-sorted VCF are split into contiguous shards of
+equal size, so that each shard covers a range of contigs and positions. Each
+shard is annotated by its own `vep.sh` pipeline (VEP, `filter_vep` and
+`bcftools +split-vep`). Pipelines run concurrently, within a budget of CPUs,
+and the annotated shards are concatenated in order without re-sorting.
+"""
+
+import concurrent.futures
+import logging
+import os
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pysam
+
+import src
+
+_FILE_IN = "data/interim/dnms_38_combined_af.vcf.gz"
+_FILE_OUT = "data/interim/dnms_38_combined_af_vep.vcf.gz"
+_VEP = ["bash", "src/annotate_dnms/vep.sh"]
+_SCRATCH = "data/scratch"
+_CPUS = 16  # CPU budget across all pipelines
+_FORK = 3  # VEP forks per pipeline; each pipeline also uses a CPU downstream
+_SHARDS_PER_PIPELINE = 2  # Smaller shards even out the finishing times
+
+logger = logging.getLogger(__name__)
+
+
+def get_pipelines(cpus=_CPUS, fork=_FORK):
+    """Number of concurrent pipelines within the CPU budget."""
+
+    return max(1, cpus // (fork + 1))
+
+
+def get_boundaries(n_records, n_shards):
+    """Record positions where each shard starts and ends."""
+
+    n_shards = max(1, min(n_shards, n_records))
+    return np.linspace(0, n_records, n_shards + 1).astype(int)
+
+
+def write_shards(path_in, directory, n_shards):
+    """Split a VCF into contiguous shards of equal size."""
+
+    with pysam.VariantFile(path_in) as vcf:
+        header = vcf.header
+        records = list(vcf)
+
+    boundaries = get_boundaries(len(records), n_shards)
+    paths = []
+
+    for i, (start, end) in enumerate(zip(boundaries[:-1], boundaries[1:])):
+        path = f"{directory}/shard_{i:04d}.vcf.gz"
+        with pysam.VariantFile(path, "wz", header=header) as vcf:
+            for record in records[start:end]:
+                vcf.write(record)
+        paths.append(path)
+
+        first, last = records[start], records[end - 1]
+        logger.info(
+            f"Shard {i}: {end - start} records, "
+            f"{first.chrom}:{first.pos}-{last.chrom}:{last.pos}"
+        )
+
+    return paths
+
+
+def run_shard(command, path_in, path_out, env):
+    """Run one pipeline, and return its wall time in seconds."""
+
+    start = time.perf_counter()
+    subprocess.run(command + [path_in, path_out], check=True, env=env)
+
+    return time.perf_counter() - start
+
+
+def gather(paths, path_out):
+    """Concatenate annotated shards, in order, under the first shard's header."""
+
+    with pysam.VariantFile(paths[0]) as vcf:
+        header = vcf.header
+
+    n = 0
+    with pysam.VariantFile(path_out, "wz", header=header) as out:
+        for path in paths:
+            with pysam.VariantFile(path) as vcf:
+                for record in vcf:
+                    record.translate(header)
+                    out.write(record)
+                    n += 1
+
+    logger.info(f"Records gathered: {n}")
+
+
+def scatter_gather(path_in, path_out, command=_VEP, cpus=_CPUS, fork=_FORK, env=None):
+    """Annotate a VCF with concurrent VEP pipelines over its shards.
+
+    `command` is called with the input and output VCF paths of each shard.
+    """
+
+    pipelines = get_pipelines(cpus, fork)
+    env = dict(env or os.environ, VEP_FORK=str(fork))
+    Path(_SCRATCH).mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(dir=_SCRATCH) as scratch:
+        shards = write_shards(path_in, scratch, pipelines * _SHARDS_PER_PIPELINE)
+        outputs = [s.replace(".vcf.gz", "_vep.vcf.gz") for s in shards]
+
+        logger.info(f"Running {len(shards)} shards in {pipelines} concurrent pipelines")
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=pipelines) as executor:
+            times = list(
+                executor.map(
+                    run_shard,
+                    [command] * len(shards),
+                    shards,
+                    outputs,
+                    [env] * len(shards),
+                )
+            )
+
+        for shard, seconds in zip(shards, times):
+            logger.info(f"{Path(shard).name}: {seconds:.1f} s")
+
+        gather(outputs, path_out)
+
+
+def main():
+    """Run as script."""
+
+    scatter_gather(_FILE_IN, _FILE_OUT)
+
+
+if __name__ == "__main__":
+    logger = src.setup_logger(src.log_file(__file__))
+    main()
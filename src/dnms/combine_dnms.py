@@ -0,0 +1,80 @@
+"""Combine GEL and Kaplanis DNMs after liftover.
+
+Each input VCF is already sorted, so the records are merged as sorted streams
+by (contig order, pos, ref, alt), holding one record per input at a time. The
+number of records from each input is kept in the output's metadata sidecar.
+"""
+
+import heapq
+import logging
+
+import pysam
+
+import src
+from src import metadata
+
+_FILES_IN = {
+    "gel_lifted": "data/interim/dnms_38_gel_lifted.vcf.gz",
+    "gel_raw": "data/interim/dnms_38_gel_raw.vcf.gz",
+    "kaplanis_lifted": "data/interim/dnms_38_kaplanis.vcf.gz",
+}
+_FILE_OUT = "data/interim/dnms_38_combined.vcf.gz"
+
+logger = logging.getLogger(__name__)
+
+
+def merge_headers(vcfs):
+    header = vcfs[0].header.copy()
+
+    for vcf in vcfs[1:]:
+        header.merge(vcf.header)
+
+    return header
+
+
+def sort_key(record, contigs):
+    return (contigs[record.chrom], record.pos, record.ref, record.alts or ())
+
+
+def stream_records(vcf, source, contigs):
+    """Records of a sorted VCF with their sort keys and source."""
+
+    for record in vcf:
+        yield sort_key(record, contigs), source, record
+
+
+def combine_dnms(paths, path_out):
+    """Merge sorted VCFs into an indexed VCF, and count records per source."""
+
+    vcfs = [pysam.VariantFile(p) for p in paths.values()]
+    header = merge_headers(vcfs)
+    contigs = {c: i for i, c in enumerate(header.contigs)}
+    streams = [stream_records(vcf, s, contigs) for s, vcf in zip(paths, vcfs)]
+    meta = metadata.vcf_metadata(counts=["source"])
+
+    with pysam.VariantFile(path_out, "wz", header=header) as out:
+        for _, source, record in heapq.merge(*streams, key=lambda r: r[0]):
+            record.translate(header)
+            out.write(record)
+            meta.add(metadata.record_row(record) + (source,))
+
+    for vcf in vcfs:
+        vcf.close()
+
+    pysam.tabix_index(path_out, force=True, preset="vcf")
+    meta.write(path_out)
+
+    logger.info(f"Records per source: {meta.to_dict()['counts']['source']}")
+
+    return meta
+
+
+def main():
+    """Run as script."""
+
+    combine_dnms(_FILES_IN, _FILE_OUT)
+
+
+if __name__ == "__main__":
+    logger = src.setup_logger(src.log_file(__file__))
+    main()
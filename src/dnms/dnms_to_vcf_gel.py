@@ -0,0 +1,133 @@
+"""Split stringent GEL DNMs by assembly, and write them to VCF.
+
+The export is read once, in chunks, and stringent-flagged rows are routed to
+GRCh37 or GRCh38. GRCh38 contigs are given a "chr" prefix where it is missing.
+Each assembly's records are sorted by the contig order of its reference, then
+position, and written as bgzipped, tabix-indexed VCFs.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+import pysam
+
+import src
+from src import metadata, reference_store
+
+_FILE_IN = "data/raw/denovo_flagged_variants_2023-05-16_09-51-50.tsv"
+_USECOLS = [0, 2, 3, 4, 5, 6, 11]
+_NAMES = ["id", "assembly", "chrom", "pos", "ref", "alt", "stringent"]
+_CHUNK_SIZE = 1_000_000
+_ASSEMBLIES = {
+    "GRCh37": ("data/interim/reference/GRCh37", "data/interim/dnms_37_gel.vcf.gz"),
+    "GRCh38": ("data/interim/reference/GRCh38", "data/interim/dnms_38_gel_raw.vcf.gz"),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def tidy_chr_names(df):
+    """Add a "chr" prefix to GRCh38 contigs which lack one."""
+
+    add_prefix = (df["assembly"] == "GRCh38") & ~df["chrom"].str.startswith("chr")
+
+    return df.assign(chrom=df["chrom"].where(~add_prefix, "chr" + df["chrom"]))
+
+
+def split_dnms(path, assemblies=_ASSEMBLIES, chunk_size=_CHUNK_SIZE):
+    """Stringent DNMs of each assembly, from one pass over the export."""
+
+    chunks = {a: [] for a in assemblies}
+
+    with pd.read_csv(
+        path,
+        sep="\t",
+        usecols=_USECOLS,
+        names=_NAMES,
+        header=0,
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunk_size,
+    ) as reader:
+        for chunk in reader:
+            chunk = chunk[chunk["stringent"] == "1"].pipe(tidy_chr_names)
+            for assembly, df in chunk.groupby("assembly"):
+                if assembly in chunks:
+                    chunks[assembly].append(df)
+
+    dnms = {
+        a: pd.concat(c, ignore_index=True).astype({"pos": np.int64})
+        if c
+        else pd.DataFrame(columns=_NAMES)
+        for a, c in chunks.items()
+    }
+
+    for assembly, df in dnms.items():
+        logger.info(f"Stringent {assembly} DNMs: {len(df)}")
+
+    return dnms
+
+
+def sort_dnms(df, contigs):
+    """Sort DNMs by contig order, then position. Unknown contigs are dropped."""
+
+    rank = contigs.get_indexer(df["chrom"])
+    unknown = rank < 0
+
+    if unknown.any():
+        logger.warning(
+            f"DNMs on contigs missing from the reference: {unknown.sum()}\n"
+            f"{df.loc[unknown, 'chrom'].value_counts()}"
+        )
+
+    order = np.lexsort((df["pos"].to_numpy(dtype=np.int64), rank))
+    return df.iloc[order[~unknown[order]]]
+
+
+def get_header(lengths):
+    header = pysam.VariantHeader()
+
+    for contig, length in lengths.items():
+        header.contigs.add(contig, length=length)
+
+    return str(header)
+
+
+def write_vcf(df, lengths, path):
+    """Write sites-only records to a bgzipped, tabix-indexed VCF."""
+
+    lines = (
+        df["chrom"]
+        + "\t"
+        + df["pos"].astype(str)
+        + "\t"
+        + df["id"]
+        + "\t"
+        + df["ref"]
+        + "\t"
+        + df["alt"]
+        + "\t.\t.\t.\n"
+    )
+
+    with pysam.BGZFile(path, "wb") as f:
+        f.write(get_header(lengths).encode())
+        f.write("".join(lines).encode())
+
+    pysam.tabix_index(path, force=True, preset="vcf")
+    metadata.write_metadata(df, path, variant=["chrom", "pos", "ref", "alt"], id_="id")
+
+
+def main():
+    """Run as script."""
+
+    dnms = split_dnms(_FILE_IN)
+
+    for assembly, (reference, path_out) in _ASSEMBLIES.items():
+        lengths = reference_store.ReferenceStore(reference).lengths
+        dnms[assembly].pipe(sort_dnms, lengths.index).pipe(write_vcf, lengths, path_out)
+
+
+if __name__ == "__main__":
+    logger = src.setup_logger(src.log_file(__file__))
+    main()
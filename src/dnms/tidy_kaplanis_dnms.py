@@ -3,16 +3,17 @@
 import logging
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
-import pysam
 
 import src
+from src import metadata, reference_store
 
 
 _LOGFILE = f"data/logs/{Path(__file__).stem}.log"
 _FILE_IN = "data/raw/kaplanis_dnms.tsv"
 _FILE_OUT = "data/interim/kaplanis_dnms_filled.tsv"
-_FASTA = "/public_data_resources/reference/GRCh37/Homo_sapiens.GRCh37.75.dna.primary_assembly.fa"
+_REFERENCE = "data/interim/reference/GRCh37"
 
 logger = logging.getLogger(__name__)
 
@@ -30,38 +31,51 @@ def read_dnms(path):
     return df
 
 
-def fill_gaps(row, fasta):
-    """Fill gaps in REF and ALT alleles."""
+def fill_gaps(df, reference):
+    """Fill gaps in REF and ALT alleles with the preceding reference base."""
 
-    if (row["ref"] != "") & (row["alt"] != ""):
-        pass
+    ref_gap = df["ref"] == ""
+    alt_gap = ~ref_gap & (df["alt"] == "")
+    gap = ref_gap | alt_gap
 
-    if row["ref"] == "":
-        pos = row["pos"] - 1
-        region = f"{row.chrom}:{pos}-{pos}"
-        ref = fasta.fetch(region=region)
+    pos = df["pos"].where(~gap, df["pos"] - 1)
+    anchor = reference_store.fetch_bases(df.loc[gap, "chrom"], pos[gap], reference)
+    anchor = anchor.reindex(df.index, fill_value="")
 
-        row["pos"] = pos
-        row["ref"] = ref
-        row["alt"] = ref + row["alt"]
+    return df.assign(
+        pos=pos,
+        ref=np.select([ref_gap, alt_gap], [anchor, anchor + df["ref"]], df["ref"]),
+        alt=np.select([ref_gap, alt_gap], [anchor + df["alt"], anchor], df["alt"]),
+    )
+
+
+def check_ref(df, reference):
+    """Log REF alleles which do not match the reference."""
+
+    matches = reference_store.validate_ref(df, reference)
+
+    logger.info(f"REF alleles not matching the reference: {(~matches).sum()}")
 
-    if row["alt"] == "":
-        pos = row["pos"] - 1
-        region = f"{row.chrom}:{pos}-{pos}"
-        ref = fasta.fetch(region=region)
+    return df
 
-        row["pos"] = pos
-        row["ref"] = ref + row["ref"]
-        row["alt"] = ref
 
-    return row
+def write_out(df, path):
+    df.to_csv(path, sep="\t", header=False, index=False)
+    metadata.write_metadata(
+        df, path, variant=["chrom", "pos", "ref", "alt"], id_="id", counts=["study"]
+    )
+
+    return df
 
 
 def main():
+    reference = reference_store.ReferenceStore(_REFERENCE)
+
     (
         read_dnms(_FILE_IN)
-        .apply(fill_gaps, fasta=pysam.FastaFile(_FASTA), axis=1)
-        .to_csv(_FILE_OUT, sep="\t", header=False, index=False)
+        .pipe(fill_gaps, reference)
+        .pipe(check_ref, reference)
+        .pipe(write_out, _FILE_OUT)
     )
     logger.info("Gaps filled.")
 
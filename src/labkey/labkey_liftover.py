@@ -0,0 +1,71 @@
+"""Lift GRCh37 variants in the tidied LabKey tables to GRCh38."""
+
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import src
+from src import liftover, metadata, reference_store
+
+_LOGFILE = f"data/logs/{Path(__file__).stem}.log"
+_REFERENCE = "data/interim/reference/GRCh38"
+_TABLES = {
+    "data/interim/labkey_tiering_clean.tsv": "data/interim/labkey_tiering_clean_38.tsv",
+    "data/interim/labkey_exit_questionnaire_acmg.tsv": "data/interim/labkey_exit_questionnaire_acmg_38.tsv",
+}
+_VARIANT = ["chr", "pos", "ref", "alt"]
+
+logger = logging.getLogger(__name__)
+
+
+def read_table(path):
+    return pd.read_csv(path, sep="\t", dtype={"chr": str, "ref": str, "alt": str})
+
+
+def lift_table(df, chain, reference):
+    """Lift GRCh37 variants to GRCh38. Rejected variants are dropped.
+
+    GRCh37 variants with a missing chr, pos, ref or alt are rejected without
+    being lifted.
+    """
+
+    is_37 = df["assembly"] == "GRCh37"
+    missing = is_37 & df[_VARIANT].isna().any(axis=1)
+    variants = df[is_37 & ~missing].rename(columns={"chr": "chrom"})
+
+    logger.info(f"GRCh37 variants: {is_37.sum()}")
+    logger.info(f"GRCh37 variants with a missing chr, pos, ref or alt: {missing.sum()}")
+
+    lifted, rejects = liftover.lift_variants(
+        variants.astype({"pos": np.int64}), chain, reference
+    )
+    lifted = lifted.rename(columns={"chrom": "chr"}).assign(assembly="GRCh38")
+    incomplete = df[missing].rename(columns={"chr": "chrom"})
+    rejects = pd.concat([incomplete.assign(reason="MissingVariant"), rejects])
+    rejects = rejects.sort_index()
+
+    logger.info(f"GRCh37 variants lifted: {len(lifted)}")
+
+    return pd.concat([df[~is_37], lifted]).sort_index(), rejects
+
+
+def main():
+    """Run as script."""
+
+    chain = liftover.load_chain()
+    reference = reference_store.ReferenceStore(_REFERENCE)
+
+    for path_in, path_out in _TABLES.items():
+        logger.info(f"Lifting {path_in}")
+
+        df, rejects = lift_table(read_table(path_in), chain, reference)
+        liftover.write_rejects(rejects, path_in)
+        df.to_csv(path_out, sep="\t", index=False)
+        metadata.write_metadata(df, path_out, counts=["assembly"])
+
+
+if __name__ == "__main__":
+    logger = src.setup_logger(_LOGFILE)
+    main()
@@ -0,0 +1,324 @@
+"""Lift variants between assemblies with a UCSC chain file.
+
+The chain file is parsed once into NumPy arrays of its ungapped blocks, sorted
+by source contig and start, and cached as a .npz. Arrays of positions are
+mapped with `searchsorted` on the block starts.
+
+Each block maps an offset from its source start to the target position
+origin + sign * offset, where sign is -1 for chains on the reverse strand of
+the target. Variants lifted to the reverse strand have their alleles
+reverse-complemented, and indels are re-anchored on the preceding target base,
+as in Picard's LiftoverVcf.
+
+Variants are rejected, with a reason, where:
+
+    NoTarget                         REF does not map to a reference contig
+    IndelStraddlesMultipleIntervals  REF spans more than one block
+    MismatchedRefAllele              REF does not match the target reference
+"""
+
+import logging
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pysam
+
+import src
+from src import metadata, reference_store
+
+_CHAIN = "data/raw/grch37_to_grch38.over.chain"
+_CACHE_DIR = "data/interim/liftover"
+_REFERENCE = "data/interim/reference/GRCh38"
+_REJECTS_DIR = "data/logs"
+_VCFS = {
+    "data/interim/dnms_37_kaplanis.vcf.gz": "data/interim/dnms_38_kaplanis.vcf.gz",
+    "data/interim/dnms_37_gel.vcf.gz": "data/interim/dnms_38_gel_lifted.vcf.gz",
+}
+_BLOCKS = ["source", "start", "length", "target", "origin", "sign"]
+_COMPLEMENT = str.maketrans("ACGTNacgtn", "TGCANtgcan")
+_SHIFT = 2**32
+
+logger = logging.getLogger(__name__)
+
+Chain = namedtuple("Chain", _BLOCKS + ["sources", "targets"])
+
+
+def parse_chain(path):
+    """Ungapped blocks of a chain file, with contig names as codes."""
+
+    sources, targets = {}, {}
+    blocks = []
+
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+
+            if not fields:
+                continue
+
+            if fields[0] == "chain":
+                source = sources.setdefault(fields[2], len(sources))
+                target = targets.setdefault(fields[7], len(targets))
+                t_pos, q_pos, q_size = int(fields[5]), int(fields[10]), int(fields[8])
+                sign = -1 if fields[9] == "-" else 1
+                continue
+
+            size = int(fields[0])
+            origin = q_size - 1 - q_pos if sign == -1 else q_pos
+            blocks.append((source, t_pos, size, target, origin, sign))
+
+            if len(fields) == 3:
+                t_pos += size + int(fields[1])
+                q_pos += size + int(fields[2])
+
+    blocks = np.array(blocks, dtype=np.int64).reshape(-1, len(_BLOCKS))
+    blocks = blocks[np.lexsort((blocks[:, 1], blocks[:, 0]))]
+
+    return Chain(
+        *blocks.T,
+        sources=np.array(list(sources), dtype=str),
+        targets=np.array(list(targets), dtype=str),
+    )
+
+
+def drop_overlaps(chain):
+    """Drop blocks overlapping an earlier block on the same source contig.
+
+    Chain files made from nets do not overlap on the source assembly, so this
+    only guards the `searchsorted` lookup.
+    """
+
+    ends = np.maximum.accumulate(chain.source * _SHIFT + chain.start + chain.length)
+    overlaps = np.concatenate(
+        [[False], chain.source[1:] * _SHIFT + chain.start[1:] < ends[:-1]]
+    )
+
+    if overlaps.any():
+        logger.warning(f"Overlapping chain blocks dropped: {overlaps.sum()}")
+
+    return chain._replace(**{b: getattr(chain, b)[~overlaps] for b in _BLOCKS})
+
+
+def load_chain(path=_CHAIN, directory=_CACHE_DIR):
+    """Chain blocks, from the cache unless the chain file is newer."""
+
+    cache = Path(directory) / f"{Path(path).name}.npz"
+
+    if cache.exists() and cache.stat().st_mtime > Path(path).stat().st_mtime:
+        with np.load(cache) as arrays:
+            return Chain(**{a: arrays[a] for a in Chain._fields})
+
+    chain = drop_overlaps(parse_chain(path))
+    cache.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(cache, **chain._asdict())
+
+    logger.info(f"Chain blocks cached: {len(chain.start)}")
+
+    return chain
+
+
+def source_codes(chain, chrom):
+    """Source contig codes, with or without a "chr" prefix. Others are -1."""
+
+    sources = pd.Index(chain.sources)
+    bare = pd.Series(chrom, dtype=str).str.replace("^chr", "", regex=True)
+    codes = sources.get_indexer(bare)
+
+    return np.where(codes >= 0, codes, sources.get_indexer("chr" + bare))
+
+
+def lift_positions(chain, codes, pos):
+    """Block and target position of 1-based source positions.
+
+    Positions outside of every block are given block -1.
+    """
+
+    keys = chain.source * _SHIFT + chain.start
+    i = np.searchsorted(keys, codes * _SHIFT + pos - 1, side="right") - 1
+    j = i.clip(min=0)
+
+    mapped = (
+        (codes >= 0)
+        & (i >= 0)
+        & (chain.source[j] == codes)
+        & (pos - 1 < chain.start[j] + chain.length[j])
+    )
+    target_pos = chain.origin[j] + chain.sign[j] * (pos - 1 - chain.start[j]) + 1
+
+    return np.where(mapped, i, -1), target_pos
+
+
+def reverse_complement(alleles):
+    return alleles.map(
+        lambda a: ",".join(x.translate(_COMPLEMENT)[::-1] for x in a.split(","))
+    )
+
+
+def reanchor(df, reference):
+    """Move the shared base of reverse-complemented indels back to the left."""
+
+    pos = df["pos"] - 1
+    anchor = reference_store.fetch_bases(df["chrom"], pos, reference).str.upper()
+    strip = lambda s: s.str.split(",").map(lambda a: ",".join(x[:-1] for x in a))
+
+    return df.assign(
+        pos=pos, ref=anchor + strip(df["ref"]), alt=anchor + strip(df["alt"])
+    )
+
+
+def lift_variants(df, chain, reference):
+    """Lift variants in chrom, pos, ref and alt columns to the target assembly.
+
+    Returns the lifted variants, and the rejected variants with a reason. Other
+    columns are kept.
+    """
+
+    codes = source_codes(chain, df["chrom"])
+    pos = df["pos"].to_numpy(dtype=np.int64)
+    first, start = lift_positions(chain, codes, pos)
+    last, end = lift_positions(chain, codes, pos + df["ref"].str.len().to_numpy() - 1)
+
+    block = first.clip(min=0)
+    reverse = chain.sign[block] == -1
+    chrom = chain.targets[chain.target[block]]
+
+    reason = pd.Series(
+        np.select(
+            [
+                (first < 0) | (last < 0) | ~np.isin(chrom, reference.lengths.index),
+                first != last,
+            ],
+            ["NoTarget", "IndelStraddlesMultipleIntervals"],
+            "",
+        ),
+        index=df.index,
+    )
+
+    lifted = df.assign(chrom=chrom, pos=np.where(reverse, end, start))[reason == ""]
+    reverse = pd.Series(reverse, index=df.index)[reason == ""]
+
+    lifted.loc[reverse, "ref"] = reverse_complement(lifted.loc[reverse, "ref"])
+    lifted.loc[reverse, "alt"] = reverse_complement(lifted.loc[reverse, "alt"])
+
+    # Indels share their first base, which is now their last base
+    indel = reverse & (lifted["ref"].str.len() != lifted["alt"].str.len())
+    indel &= lifted["ref"].str[-1] == lifted["alt"].str[-1]
+    lifted.loc[indel] = reanchor(lifted.loc[indel], reference)
+
+    matches = reference_store.validate_ref(lifted, reference)
+    reason[matches[~matches].index] = "MismatchedRefAllele"
+
+    logger.info(f"Variants lifted: {matches.sum()}")
+    logger.info(f"Variants rejected:\n{reason[reason != ''].value_counts()}")
+
+    rejected = reason != ""
+
+    return lifted[matches], df[rejected].assign(reason=reason[rejected])
+
+
+def write_rejects(df, path_in, directory=_REJECTS_DIR):
+    """Write rejected variants to the logs, as Picard's REJECT file."""
+
+    path = f"{directory}/liftover_rejected_{Path(path_in).name.split('.')[0]}.tsv"
+    df.to_csv(path, sep="\t", index=False)
+    metadata.write_metadata(
+        df, path, variant=["chrom", "pos", "ref", "alt"], counts=["reason"]
+    )
+
+    return df
+
+
+def sort_variants(df, reference):
+    """Sort variants by the reference contig order, then position."""
+
+    rank = reference.lengths.index.get_indexer(df["chrom"])
+    return df.iloc[np.lexsort((df["pos"].to_numpy(), rank))]
+
+
+def read_vcf(path):
+    """VCF header, and its records with their variants as a dataframe."""
+
+    with pysam.VariantFile(path) as vcf:
+        header = vcf.header
+        records = list(vcf)
+
+    df = pd.DataFrame(
+        [(r.chrom, r.pos, r.id, r.ref, ",".join(r.alts or ["."])) for r in records],
+        columns=["chrom", "pos", "id", "ref", "alt"],
+    )
+
+    return header, records, df
+
+
+def lift_header(header, reference):
+    """Copy of a VCF header, with the contigs of the target reference."""
+
+    lifted = pysam.VariantHeader()
+
+    for record in header.records:
+        if record.type != "CONTIG":
+            lifted.add_record(record)
+    for contig, length in reference.lengths.items():
+        lifted.contigs.add(contig, length=length)
+    for sample in header.samples:
+        lifted.add_sample(sample)
+
+    return lifted
+
+
+def write_vcf(header, records, df, path):
+    """Write records at their lifted variants, in the order of the dataframe."""
+
+    with pysam.VariantFile(path, "wz", header=header) as vcf:
+        for i, chrom, pos, ref, alt in df[["chrom", "pos", "ref", "alt"]].itertuples():
+            record = records[i]
+            lifted = vcf.new_record(
+                contig=chrom,
+                start=pos - 1,
+                alleles=[ref] + alt.split(","),
+                id=record.id,
+                qual=record.qual,
+                filter=list(record.filter),
+                info=dict(record.info),
+            )
+            for sample in record.samples:
+                for key, value in record.samples[sample].items():
+                    lifted.samples[sample][key] = value
+            vcf.write(lifted)
+
+    pysam.tabix_index(path, force=True, preset="vcf")
+    metadata.write_metadata(df, path, variant=["chrom", "pos", "ref", "alt"], id_="id")
+
+
+def lift_vcf(path_in, path_out, chain, reference):
+    """Lift a VCF to the target assembly, writing rejects to the logs."""
+
+    header, records, df = read_vcf(path_in)
+
+    logger.info(f"Lifting {path_in}: {len(df)} records")
+
+    lifted, rejects = lift_variants(df, chain, reference)
+    write_rejects(rejects, path_in)
+    write_vcf(
+        lift_header(header, reference),
+        records,
+        sort_variants(lifted, reference),
+        path_out,
+    )
+
+
+def main():
+    """Run as script."""
+
+    chain = load_chain()
+    reference = reference_store.ReferenceStore(_REFERENCE)
+
+    for path_in, path_out in _VCFS.items():
+        lift_vcf(path_in, path_out, chain, reference)
+
+
+if __name__ == "__main__":
+    logger = src.setup_logger(src.log_file(__file__))
+    main()
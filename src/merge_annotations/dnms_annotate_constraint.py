@@ -3,15 +3,18 @@
 import logging
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
 import src
 from src.annotate_dnms.dnms_tidy_logging import read_tidy_dnms
+from src.merge_annotations import nmd_region_index, read_uom_csf
 
 _LOGFILE = f"data/logs/{Path(__file__).stem}.log"
 _DNMS_VEP_TIDY = "data/interim/dnms_38_combined_af_vep_tidy_dedup.tsv"
 _REGIONAL_NONSENSE_CONSTRAINT = "data/uom_csf/regional_nonsense_constraint.tsv"
 _NMD_ANNOTATION = "data/uom_csf/nmd_annotations.tsv"
+_NMD_INDEX = "data/interim/nmd_region_index.npz"
 _GENE_IDS = "data/uom_csf/gene_ids.tsv"
 _GENEMAP2_SIMPLE = "data/uom_csf/genemap2_simple.tsv"
 _FILE_OUT = "data/interim/dnms_annotated.tsv"
@@ -40,14 +43,40 @@ def get_nonsense_constraint(path):
     ]
 
 
-def get_nmd(path):
-    """Get NMD annotations."""
+def get_span_positions(dnms):
+    """Every position in the REF span of each DNM."""
+
+    length = dnms["ref"].str.len().to_numpy()
+    start = np.repeat(dnms["pos"].to_numpy(), length)
+    offset = np.arange(length.sum()) - np.repeat(np.cumsum(length) - length, length)
+
+    return pd.DataFrame(
+        {"chr": np.repeat(dnms["chr"].to_numpy(), length), "pos": start + offset}
+    )
+
+
+def get_nmd(path, dnms):
+    """Get NMD annotations at the positions spanned by DNMs."""
 
     logger.info("Getting NMD annotations.")
 
-    return pd.read_csv(
-        path, sep="\t", usecols=["chr", "pos", "transcript_id", "nmd_definitive"]
-    ).set_axis(["chr", "pos", "enst", "region"], axis=1)
+    return read_uom_csf.read_positions(
+        path,
+        get_span_positions(dnms),
+        columns=["chr", "pos", "transcript_id", "nmd_definitive"],
+        categories=["transcript_id", "nmd_definitive"],
+    ).dropna()
+
+
+def get_nmd_index(path_index, path_annotation, dnms):
+    """NMD region index, or one compiled from the annotations at the DNMs."""
+
+    if Path(path_index).exists():
+        return nmd_region_index.load_index(path_index)
+
+    logger.info(f"No NMD region index at {path_index}.")
+
+    return nmd_region_index.compile_index(get_nmd(path_annotation, dnms))
 
 
 def get_genes(path):
@@ -122,7 +151,7 @@ def main():
 
     dnms = read_tidy_dnms(_DNMS_VEP_TIDY)
     cst = get_nonsense_constraint(_REGIONAL_NONSENSE_CONSTRAINT)
-    nmd = get_nmd(_NMD_ANNOTATION)
+    nmd = get_nmd_index(_NMD_INDEX, _NMD_ANNOTATION, dnms)
     gene_ids = get_genes(_GENE_IDS)
     omim = get_omim(_GENEMAP2_SIMPLE, _GENE_IDS)
 
@@ -136,16 +165,15 @@ def main():
     logger.info(f"DNMs after merging with gene symbols: {len(df)}")
     logger.info(f"DNMs with a gene symbol: {(~df.symbol.isna()).sum()}")
 
-    # Merge NMD annotations
-    df = df.merge(nmd, how="left")
+    # Annotate NMD regions
+    df = df.pipe(nmd_region_index.annotate_regions, nmd)
 
-    logger.info(f"DNMs after merging NMD annotations: {len(df)}")
+    logger.info(f"DNMs after annotating NMD regions: {len(df)}")
     logger.info(f"DNMs without an NMD region: {df.region.isna().sum()}")
     logger.info(
-        "The DNMs without an NMD region annotation are all indels. "
-        "The most 3' position of these indels is outside of the CDS, "
-        "and they therefore lack an NMD annotation. "
-        "There is no easy way to rectify this, but we keep them for completeness."
+        "Indels whose most 3' position is outside of the CDS lack a per-position "
+        "NMD annotation. They are given the region of the first CDS interval "
+        "they overlap."
     )
 
     # Merge constraint data
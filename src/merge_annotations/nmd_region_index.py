@@ -0,0 +1,163 @@
+"""Interval index of NMD regions, compiled from the per-position annotations.
+
+Consecutive positions of a transcript with the same NMD region are encoded as
+one interval (start, end, region), with 1-based inclusive coordinates. The
+intervals of each transcript do not overlap, so they are sorted by both start
+and end, and lookups are vectorised with `searchsorted` over (enst, pos).
+
+Overlap queries find the first interval, in genomic order, overlapping each
+span of positions. They give a region to indels whose most 3' position is
+outside of the CDS, which have no region in the per-position annotations.
+"""
+
+import logging
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import src
+
+_NMD_ANNOTATION = "data/uom_csf/nmd_annotations.tsv"
+_FILE_OUT = "data/interim/nmd_region_index.npz"
+_SHIFT = 2**32
+
+logger = logging.getLogger(__name__)
+
+Index = namedtuple(
+    "Index", ["transcript", "start", "end", "region", "chrom", "transcripts", "regions"]
+)
+
+
+def read_nmd(path):
+    return pd.read_csv(
+        path,
+        sep="\t",
+        usecols=["chr", "pos", "transcript_id", "nmd_definitive"],
+        dtype={c: "category" for c in ["chr", "transcript_id", "nmd_definitive"]},
+    ).dropna()
+
+
+def compile_index(df):
+    """Run-length encode per-position regions into intervals per transcript."""
+
+    df = df.sort_values(["transcript_id", "pos"])
+    transcript = df["transcript_id"].cat.codes.to_numpy(dtype=np.int64)
+    pos = df["pos"].to_numpy(dtype=np.int64)
+    region = df["nmd_definitive"].cat.codes.to_numpy(dtype=np.int8)
+
+    new_run = np.ones(len(df), dtype=bool)
+    new_run[1:] = (
+        (transcript[1:] != transcript[:-1])
+        | (pos[1:] != pos[:-1] + 1)
+        | (region[1:] != region[:-1])
+    )
+    starts = np.flatnonzero(new_run)
+    ends = np.append(starts[1:], len(df)) - 1
+
+    # Each transcript is on one contig
+    chrom = (
+        df.groupby("transcript_id", observed=False)["chr"]
+        .first()
+        .astype(str)
+        .to_numpy(dtype=str)
+    )
+
+    index = Index(
+        transcript=transcript[starts],
+        start=pos[starts],
+        end=pos[ends],
+        region=region[starts],
+        chrom=chrom,
+        transcripts=df["transcript_id"].cat.categories.to_numpy(dtype=str),
+        regions=df["nmd_definitive"].cat.categories.to_numpy(dtype=str),
+    )
+
+    logger.info(f"Positions: {len(df)}")
+    logger.info(f"Intervals: {len(index.start)}")
+
+    return index
+
+
+def write_index(index, path):
+    np.savez(path, **index._asdict())
+    return index
+
+
+def load_index(path=_FILE_OUT):
+    with np.load(path) as arrays:
+        return Index(**{a: arrays[a] for a in Index._fields})
+
+
+def find_overlaps(index, chrom, enst, start, end):
+    """Region of the first interval overlapping each span, or NaN.
+
+    Spans are given by arrays of contig, transcript ID and 1-based inclusive
+    start and end positions.
+    """
+
+    transcript = pd.Index(index.transcripts).get_indexer(enst)
+    regions = np.append(index.regions.astype(object), np.nan)
+    if len(index.start) == 0:
+        return regions[np.full(len(transcript), -1)]
+
+    known = transcript >= 0
+    keys_start = index.transcript * _SHIFT + index.start
+    keys_end = index.transcript * _SHIFT + index.end
+
+    # First interval ending at or after the span start, if it starts by the span end
+    start = transcript * _SHIFT + np.asarray(start)
+    i = np.searchsorted(keys_end, start, side="left").clip(max=len(keys_end) - 1)
+    found = (
+        known
+        & (index.transcript[i] == transcript)
+        & (keys_end[i] >= start)
+        & (keys_start[i] <= transcript * _SHIFT + np.asarray(end))
+        & (index.chrom[transcript.clip(min=0)] == np.asarray(chrom, dtype=str))
+    )
+
+    return regions[np.where(found, index.region[i], -1)]
+
+
+def lookup(index, chrom, enst, pos):
+    """Region of each position, or NaN, as a left merge on (chr, pos, enst)."""
+
+    return find_overlaps(index, chrom, enst, pos, pos)
+
+
+def annotate_regions(df, index):
+    """NMD region of each DNM.
+
+    Indels without a region at their position are given the region of the
+    first CDS interval they overlap.
+    """
+
+    region = lookup(index, df["chr"], df["enst"], df["pos"])
+    end = df["pos"] + df["ref"].str.len() - 1
+    indel = (df["ref"].str.len() != df["alt"].str.len()).to_numpy()
+    missing = pd.isna(region) & indel
+
+    region[missing] = find_overlaps(
+        index,
+        df.loc[missing, "chr"],
+        df.loc[missing, "enst"],
+        df.loc[missing, "pos"],
+        end[missing],
+    )
+
+    n_found = missing.sum() - pd.isna(region[missing]).sum()
+    logger.info(f"Indels given a region by overlap: {n_found}")
+
+    return df.assign(region=region)
+
+
+def main():
+    """Run as script."""
+
+    index = compile_index(read_nmd(_NMD_ANNOTATION))
+    write_index(index, _FILE_OUT)
+
+
+if __name__ == "__main__":
+    logger = src.setup_logger(src.log_file(__file__))
+    main()
@@ -0,0 +1,92 @@
+"""Read the rows of UoM CSF per-position annotation files at given positions.
+
+Files are parsed in blocks with the pyarrow CSV reader, with int32 positions
+and categorical strings. Each block is filtered on (contig, pos) variant keys,
+with empty alleles, in a thread pool. Only matching rows are kept, so memory
+scales with the number of matches rather than the size of the file.
+"""
+
+import collections
+import concurrent.futures
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import csv
+
+from src import variant_keys
+
+_BLOCK_SIZE = 64 * 2**20
+_WORKERS = 4
+
+logger = logging.getLogger(__name__)
+
+
+def get_keys(chrom, pos, encoder):
+    """Keys of (contig, pos), with or without a "chr" prefix on contig names."""
+
+    df = pd.DataFrame({"chr": chrom, "pos": pos, "ref": "", "alt": ""})
+    return encoder.encode(df)
+
+
+def open_reader(path, columns, categories, block_size=_BLOCK_SIZE):
+    types = {"pos": pa.int32()}
+    types.update({c: pa.dictionary(pa.int32(), pa.string()) for c in categories})
+
+    return csv.open_csv(
+        path,
+        read_options=csv.ReadOptions(block_size=block_size),
+        parse_options=csv.ParseOptions(delimiter="\t"),
+        convert_options=csv.ConvertOptions(include_columns=columns, column_types=types),
+    )
+
+
+def filter_batch(batch, keys, encoder):
+    df = batch.to_pandas()
+    return df[variant_keys.isin(get_keys(df["chr"], df["pos"], encoder), keys)]
+
+
+def read_positions(
+    path,
+    positions,
+    columns,
+    categories=(),
+    block_size=_BLOCK_SIZE,
+    workers=_WORKERS,
+):
+    """Rows of a per-position file at the (chr, pos) of a dataframe.
+
+    `columns` must include chr and pos. Columns in `categories` are read as
+    categoricals.
+    """
+
+    encoder = variant_keys.VariantKeys()
+    keys = np.unique(get_keys(positions["chr"], positions["pos"], encoder))
+    categories = ["chr"] + [c for c in categories if c != "chr"]
+    reader = open_reader(path, columns, categories, block_size)
+
+    start = time.perf_counter()
+    n_rows = 0
+    chunks = []
+    pending = collections.deque()
+
+    # A bounded number of blocks are held at once
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in reader:
+            n_rows += batch.num_rows
+            pending.append(executor.submit(filter_batch, batch, keys, encoder))
+            if len(pending) > 2 * workers:
+                chunks.append(pending.popleft().result())
+
+        chunks.extend(f.result() for f in pending)
+
+    seconds = time.perf_counter() - start
+    df = pd.concat(chunks, ignore_index=True).astype({c: "category" for c in categories})
+
+    logger.info(f"Rows read from {path}: {n_rows}")
+    logger.info(f"Rows at the given positions: {len(df)}")
+    logger.info(f"Throughput: {n_rows / seconds:,.0f} rows per second")
+
+    return df[columns]
@@ -0,0 +1,145 @@
+"""Sidecar metadata of the files written by pipeline stages.
+
+Counts are accumulated while a file is written, and saved as JSON beside it,
+at `{path}.json`, so that they can be read without re-reading the file:
+
+    rows         rows or records written
+    variants     unique (chr, pos, ref, alt)
+    ids          unique non-missing IDs, or (group, ID) pairs, where the file has them
+    ids_by_group unique non-missing IDs in each group, such as cohort
+    variant_ids  unique (chr, pos, ref, alt, ID)
+    counts       value counts of categorical columns, such as cohort and csq,
+                 without missing values
+"""
+
+import collections
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+
+from src import variant_keys
+
+_VARIANT = ["chr", "pos", "ref", "alt"]
+_VCF_VARIANT = ["chrom", "pos", "ref", "alt"]
+_BATCH_SIZE = 100_000
+
+logger = logging.getLogger(__name__)
+
+
+def sidecar_path(path):
+    return f"{path}.json"
+
+
+class Metadata:
+    """Counts of the rows of a file, accumulated in batches while it is written.
+
+    Rows are added as dataframes with `update`, or as tuples of the `variant`,
+    `id_`, `group` and `counts` columns, in that order, with `add`. Where a
+    `group` column is given, IDs are counted within each group.
+    """
+
+    def __init__(
+        self, variant=_VARIANT, id_=None, group=None, counts=(), batch_size=_BATCH_SIZE
+    ):
+        self.variant = list(variant)
+        self.id_ = id_
+        self.group = group
+        self.columns = list(
+            dict.fromkeys(self.variant + [c for c in [id_, group] if c] + list(counts))
+        )
+        self.batch_size = batch_size
+
+        self.rows = 0
+        self.encoder = variant_keys.VariantKeys()
+        self.keys = np.empty(0, dtype=np.int64)
+        self.ids = collections.defaultdict(set)
+        self.variant_ids = set()
+        self.counts = {c: collections.Counter() for c in counts}
+        self.buffer = []
+
+    def update(self, df):
+        self.rows += len(df)
+        keys = self.encoder.encode(df.astype({self.variant[1]: np.int64}), self.variant)
+        self.keys = np.union1d(self.keys, keys)
+
+        if self.id_:
+            ids = df[self.id_].astype(str)
+            self.variant_ids.update(zip(keys.tolist(), ids))
+
+            groups = pd.Series("", df.index)
+            if self.group:
+                groups = df[self.group].astype(str)
+            present = df[self.id_].notna() & ~ids.isin(["", "."])
+            for group, group_ids in ids[present].groupby(groups[present]):
+                self.ids[group].update(group_ids)
+        for column, counter in self.counts.items():
+            values = df[column].dropna().astype(str)
+            counter.update(values[values != ""])
+
+        return self
+
+    def add(self, row):
+        self.buffer.append(row)
+
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.update(pd.DataFrame(self.buffer, columns=self.columns))
+            self.buffer = []
+
+        return self
+
+    def to_dict(self):
+        self.flush()
+
+        return {
+            "rows": self.rows,
+            "variants": len(self.keys),
+            "ids": sum(len(ids) for ids in self.ids.values()) if self.id_ else None,
+            "ids_by_group": (
+                {g: len(ids) for g, ids in sorted(self.ids.items())}
+                if self.group
+                else None
+            ),
+            "variant_ids": len(self.variant_ids) if self.id_ else None,
+            "counts": {
+                c: dict(counter.most_common()) for c, counter in self.counts.items()
+            },
+        }
+
+    def write(self, path):
+        """Write the metadata of the file at `path` to its sidecar."""
+
+        with open(sidecar_path(path), "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+        logger.info(f"Rows written to {path}: {self.rows}")
+
+
+def vcf_metadata(counts=()):
+    """Metadata of VCF records, added as `record_row(record)` plus `counts`."""
+
+    return Metadata(variant=_VCF_VARIANT, id_="id", counts=counts)
+
+
+def record_row(record):
+    alts = ",".join(record.alts or ["."])
+    return (record.chrom, record.pos, record.ref, alts, record.id or ".")
+
+
+def write_metadata(df, path, **kwargs):
+    """Write the metadata of a dataframe written to `path` in one go."""
+
+    Metadata(**kwargs).update(df).write(path)
+    return df
+
+
+def read_metadata(path):
+    """Metadata of the file at `path`, from its sidecar."""
+
+    with open(sidecar_path(path)) as f:
+        return json.load(f)
@@ -0,0 +1,209 @@
+"""Packed 2-bit reference genomes, memory-mapped for fast random access.
+
+A FASTA is converted once into a directory of .npy arrays per contig:
+
+    {contig}.bases.npy  A/C/G/T as 2-bit codes, four bases per byte
+    {contig}.n.npy      (start, end) intervals of N, 0-based and half-open
+    {contig}.lower.npy  (start, end) intervals of lower-case (soft-masked) bases
+    {contig}.other.npy  positions of other IUPAC codes, with their characters
+
+with the contig lengths in lengths.tsv. Bases are decoded exactly, including
+case, for arrays of positions with NumPy indexing.
+"""
+
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pysam
+
+import src
+
+_FASTAS = {
+    "GRCh37": "/public_data_resources/reference/GRCh37/Homo_sapiens.GRCh37.75.dna.primary_assembly.fa",
+    "GRCh38": "/public_data_resources/reference/GRCh38/GCA_000001405.15_GRCh38_no_alt_analysis_set.fna",
+}
+_STORE = "data/interim/reference"
+_CODES = np.full(256, 255, dtype=np.uint8)
+_CODES[list(b"ACGT")] = [0, 1, 2, 3]
+_LETTERS = np.frombuffer(b"ACGT", dtype=np.uint8)
+_LOWER = ord("a") - ord("A")
+
+logger = logging.getLogger(__name__)
+
+
+def get_intervals(mask):
+    """Half-open (start, end) intervals of runs of True."""
+
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return np.stack([np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)], axis=1)
+
+
+def pack_bases(codes):
+    """Pack 2-bit codes, four per byte, with the first base in the high bits."""
+
+    padded = np.zeros(-(-len(codes) // 4) * 4, dtype=np.uint8)
+    padded[: len(codes)] = codes & 3
+    quads = padded.reshape(-1, 4)
+
+    return (quads[:, 0] << 6) | (quads[:, 1] << 4) | (quads[:, 2] << 2) | quads[:, 3]
+
+
+def convert_contig(sequence, path):
+    """Write the arrays of one contig's sequence."""
+
+    raw = np.frombuffer(sequence.encode(), dtype=np.uint8)
+    lower = (raw >= ord("a")) & (raw <= ord("z"))
+    upper = np.where(lower, raw - _LOWER, raw).astype(np.uint8)
+    codes = _CODES[upper]
+    other = (codes == 255) & (upper != ord("N"))
+
+    np.save(f"{path}.bases.npy", pack_bases(codes))
+    np.save(f"{path}.n.npy", get_intervals(upper == ord("N")))
+    np.save(f"{path}.lower.npy", get_intervals(lower))
+    np.save(
+        f"{path}.other.npy",
+        np.stack([np.flatnonzero(other), upper[other]], axis=1).astype(np.int64),
+    )
+
+    return len(raw)
+
+
+def convert_fasta(fasta, directory):
+    """Convert an indexed FASTA into a reference store."""
+
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    lengths = {}
+
+    with pysam.FastaFile(fasta) as f:
+        for contig in f.references:
+            lengths[contig] = convert_contig(f.fetch(contig), f"{directory}/{contig}")
+            logger.info(f"{contig}: {lengths[contig]} bases")
+
+    pd.Series(lengths, name="length").rename_axis("contig").to_csv(
+        f"{directory}/lengths.tsv", sep="\t"
+    )
+
+
+def in_intervals(intervals, pos):
+    """Whether each 0-based position is in one of the sorted intervals."""
+
+    if len(intervals) == 0:
+        return np.zeros(pos.shape, dtype=bool)
+
+    i = np.searchsorted(intervals[:, 0], pos, side="right") - 1
+
+    return (i >= 0) & (pos < intervals[i.clip(min=0), 1])
+
+
+class ReferenceStore:
+    """Random access to the bases of a converted reference genome."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.lengths = pd.read_csv(
+            self.directory / "lengths.tsv", sep="\t", dtype={"contig": str}
+        ).set_index("contig")["length"]
+        self.contigs = {}
+
+    def get_contig(self, contig):
+        """Memory-mapped arrays of a contig, loaded on first use."""
+
+        contig = str(contig)
+        if contig not in self.contigs:
+            path = self.directory / contig
+            self.contigs[contig] = {
+                a: np.load(f"{path}.{a}.npy", mmap_mode="r")
+                for a in ["bases", "n", "lower", "other"]
+            }
+
+        return self.contigs[contig]
+
+    def decode(self, contig, pos):
+        """ASCII codes of the bases at an array of 0-based positions."""
+
+        arrays = self.get_contig(contig)
+        pos = np.asarray(pos, dtype=np.int64)
+
+        assert ((pos >= 0) & (pos < self.lengths[str(contig)])).all(), (
+            f"Positions outside of contig {contig}."
+        )
+
+        shift = (6 - 2 * (pos & 3)).astype(np.uint8)
+        letters = _LETTERS[(arrays["bases"][pos >> 2] >> shift) & 3]
+        letters = np.where(in_intervals(arrays["n"], pos), ord("N"), letters)
+
+        other = arrays["other"]
+        if len(other):
+            i = np.searchsorted(other[:, 0], pos).clip(max=len(other) - 1)
+            letters = np.where(other[i, 0] == pos, other[i, 1], letters)
+
+        lower = in_intervals(arrays["lower"], pos)
+
+        return np.where(lower, letters + _LOWER, letters).astype(np.uint8)
+
+    def bases(self, contig, pos):
+        """Bases at an array of 1-based positions, as strings."""
+
+        return self.decode(contig, np.asarray(pos) - 1).view("S1").astype(str)
+
+    def kmers(self, contig, pos, k):
+        """Sequences of length k starting at an array of 1-based positions."""
+
+        pos = np.asarray(pos, dtype=np.int64)
+        codes = self.decode(contig, (pos[:, None] - 1) + np.arange(k))
+
+        return np.ascontiguousarray(codes).view(f"S{k}").ravel().astype(str)
+
+    def fetch(self, contig, start, end):
+        """Sequence of a 0-based, half-open region, as `pysam.FastaFile.fetch`."""
+
+        return self.decode(contig, np.arange(start, end)).tobytes().decode()
+
+
+def fetch_bases(chrom, pos, reference):
+    """Reference bases at 1-based positions, as a series aligned to `pos`."""
+
+    bases = pd.Series("", index=pos.index, dtype=object)
+
+    for contig, positions in pos.groupby(chrom):
+        bases[positions.index] = reference.bases(contig, positions.to_numpy())
+
+    return bases
+
+
+def validate_ref(df, reference):
+    """Whether the REF allele of each variant matches the reference.
+
+    `df` has chrom, pos and ref columns, with 1-based positions. Soft-masked
+    bases match, as in bcftools and Picard. Variants on contigs missing from
+    the reference, or which extend past the contig end, do not match.
+    """
+
+    matches = pd.Series(False, index=df.index)
+    length = df["ref"].str.len()
+    in_range = (df["pos"] >= 1) & (
+        df["pos"] + length - 1 <= df["chrom"].map(reference.lengths)
+    )
+
+    logger.info(f"Variants outside of the reference contigs: {(~in_range).sum()}")
+
+    df = df[in_range]
+    for (contig, length), group in df.groupby([df["chrom"], df["ref"].str.len()]):
+        kmers = reference.kmers(contig, group["pos"].to_numpy(), length)
+        matches[group.index] = np.char.upper(kmers) == group["ref"].str.upper()
+
+    return matches
+
+
+def main():
+    """Run as script."""
+
+    for genome, fasta in _FASTAS.items():
+        convert_fasta(fasta, f"{_STORE}/{genome}")
+
+
+if __name__ == "__main__":
+    logger = src.setup_logger(src.log_file(__file__))
+    main()
@@ -1,14 +1,16 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
-# Count the number of GEL DNMs
-GEL_LIFTED="data/interim/dnms_38_gel_lifted.vcf.gz"
-GEL_RAW="data/interim/dnms_38_gel_raw.vcf.gz"
-KAPLANIS_LIFTED="data/interim/dnms_38_kaplanis.vcf.gz"
+# Count the number of GEL DNMs, from the metadata sidecar of the combined DNMs
+SIDECAR="data/interim/dnms_38_combined.vcf.gz.json"
 
-WC_37=$(zcat $GEL_LIFTED | grep -v "^#" | wc -l)
-WC_38=$(zcat $GEL_RAW | grep -v "^#" | wc -l)
-WC_KAPLANIS=$(zcat $KAPLANIS_LIFTED | grep -v "^#" | wc -l)
+get_count() {
+    python3 -c "import json, sys; print(json.load(open(sys.argv[1]))['counts']['source'].get(sys.argv[2], 0))" $SIDECAR $1
+}
+
+WC_37=$(get_count gel_lifted)
+WC_38=$(get_count gel_raw)
+WC_KAPLANIS=$(get_count kaplanis_lifted)
 
 echo "GEL GRCh37 variants after liftOver:" $WC_37
 echo "GEL GRCh38 variants:" $WC_38
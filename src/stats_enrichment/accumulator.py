@@ -0,0 +1,154 @@
+"""Online summary statistics of bootstrapped fold changes.
+
+Replicates are consumed in batches and summarised per stratum by exact tail
+counts against the null, and a fixed-grid histogram of log2 fold changes from
+which quantiles are interpolated. Memory use does not grow with the number of
+replicates.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+_LOG2_RANGE = 8  # Histogram spans fold changes of 2**-8 to 2**8
+_BINS = 16000  # Bins of 0.001 log2 units; quantiles are accurate to ~0.07 %
+
+logger = logging.getLogger(__name__)
+
+
+class FoldChangeAccumulator:
+    """Running confidence intervals and P values for fold changes per stratum.
+
+    Values below or above the histogram grid (including fold changes of zero or
+    infinity) are counted in under- and overflow bins. Quantiles falling in
+    these bins are given by the running minimum or maximum.
+    """
+
+    def __init__(self, index, h0=1, log2_range=_LOG2_RANGE, bins=_BINS):
+        self.index = index
+        self.h0 = h0
+        self.edges = np.linspace(-log2_range, log2_range, bins + 1)
+        self.width = self.edges[1] - self.edges[0]
+
+        n_strata = len(index)
+        self.n = np.zeros(n_strata, dtype=np.int64)
+        self.less = np.zeros(n_strata, dtype=np.int64)
+        self.greater = np.zeros(n_strata, dtype=np.int64)
+        self.counts = np.zeros((n_strata, bins + 2), dtype=np.int64)
+        self.min = np.full(n_strata, np.inf)
+        self.max = np.full(n_strata, -np.inf)
+
+    def update(self, fc, strata=None):
+        """Add a batch of replicates, with shape (replicates, strata).
+
+        If given, `strata` are the positions of the columns of `fc` in the
+        index. By default, `fc` has one column per stratum.
+        """
+
+        strata = np.arange(len(self.index)) if strata is None else np.asarray(strata)
+        nb = self.counts.shape[1]
+        valid = ~np.isnan(fc)
+
+        self.n[strata] += len(fc)
+        self.less[strata] += (fc < self.h0).sum(axis=0)
+        self.greater[strata] += (fc > self.h0).sum(axis=0)
+        self.min[strata] = np.fmin(self.min[strata], np.nanmin(fc, 0, initial=np.inf))
+        self.max[strata] = np.fmax(self.max[strata], np.nanmax(fc, 0, initial=-np.inf))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            position = (np.log2(fc) - self.edges[0]) / self.width
+
+        bins = np.floor(np.clip(np.nan_to_num(position, nan=0), -1, nb - 2))
+        bins = bins.astype(int) + 1
+        flat = (bins + np.arange(len(strata)) * nb)[valid]
+        self.counts[strata] += np.bincount(flat, minlength=len(strata) * nb).reshape(
+            -1, nb
+        )
+
+        return self
+
+    def order_statistics(self, k):
+        """Approximate the k-th smallest value of each stratum, from zero.
+
+        Values are assumed to be evenly spread within their histogram bin.
+        """
+
+        nb = self.counts.shape[1]
+        cumulative = self.counts.cumsum(axis=1)
+        rows = np.arange(len(k))
+
+        bins = (cumulative <= k[:, None]).sum(axis=1).clip(max=nb - 1)
+        count = self.counts[rows, bins]
+        before = cumulative[rows, bins] - count
+        within = (k - before + 0.5) / count.clip(min=1)
+
+        log2_fc = self.edges[(bins - 1).clip(0, nb - 2)] + within * self.width
+        value = np.clip(2**log2_fc, self.min, self.max)
+        value = np.where(bins == 0, self.min, value)
+
+        return np.where(bins == nb - 1, self.max, value)
+
+    def quantiles(self, q):
+        """Interpolate the q-th quantile of each stratum, as `DataFrame.quantile`."""
+
+        n_valid = self.counts.sum(axis=1)
+        rank = q * (n_valid - 1).clip(min=0)
+        lo = self.order_statistics(np.floor(rank))
+        hi = self.order_statistics(np.ceil(rank))
+
+        with np.errstate(invalid="ignore"):
+            quantile = np.where(hi > lo, lo + (rank - np.floor(rank)) * (hi - lo), lo)
+
+        return np.where(n_valid > 0, quantile, np.nan)
+
+    def confints(self, q_lo=0.025, q_hi=0.975):
+        return pd.DataFrame(
+            {"fc_ci_lo": self.quantiles(q_lo), "fc_ci_hi": self.quantiles(q_hi)},
+            index=self.index,
+        )
+
+    def p_vals(self):
+        with np.errstate(invalid="ignore"):
+            p = np.minimum(self.less, self.greater) / self.n * 2
+
+        return pd.Series(p, index=self.index, name="p")
+
+    def mc_errors(self, q_lo=0.025, q_hi=0.975):
+        """Monte-Carlo standard errors of the confidence limits and P values.
+
+        The error of a limit is half the distance between the quantiles one
+        binomial standard error either side of it. The error of a P value uses
+        add-one smoothed tail counts, so that P values of zero are not taken to
+        be exact.
+        """
+
+        n_valid = self.counts.sum(axis=1)
+
+        def quantile_error(q):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                d = np.sqrt(q * (1 - q) / n_valid)
+                lo = self.quantiles(np.clip(q - d, 0, 1))
+                hi = self.quantiles(np.clip(q + d, 0, 1))
+
+            return (hi - lo) / 2
+
+        tail = (np.minimum(self.less, self.greater) + 1) / (self.n + 2)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p_error = 2 * np.sqrt(tail * (1 - tail) / self.n)
+
+        return pd.DataFrame(
+            {
+                "n_boot": self.n,
+                "fc_ci_lo_mcse": quantile_error(q_lo),
+                "fc_ci_hi_mcse": quantile_error(q_hi),
+                "p_mcse": p_error,
+            },
+            index=self.index,
+        )
+
+    def statistics(self):
+        """Confidence intervals and P values, as `bootstrap_statistics`."""
+
+        return pd.concat([self.confints(), self.p_vals()], axis=1)
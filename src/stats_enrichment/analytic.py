@@ -0,0 +1,109 @@
+"""Closed-form confidence intervals and tests for DNM enrichment.
+
+The fold change of a group is the ratio of the observed / expected ratios in its
+constrained and unconstrained strata. Given the total number of DNMs in the
+group, the number in the constrained stratum is binomial, with a probability
+that is a monotone function of the fold change. All statistics are computed
+for every group at once.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import special, stats
+
+logger = logging.getLogger(__name__)
+
+
+def pivot_constraint(df):
+    """One row per group, with constrained and unconstrained counts as columns."""
+
+    wide = df[["gnomad_exp", "dnms_obs"]].unstack("constraint")
+
+    return pd.DataFrame(
+        {
+            "exp_c": wide[("gnomad_exp", "constrained")],
+            "exp_u": wide[("gnomad_exp", "unconstrained")],
+            "obs_c": wide[("dnms_obs", "constrained")],
+            "obs_u": wide[("dnms_obs", "unconstrained")],
+        }
+    )
+
+
+def odds_to_fc(pi, df):
+    """Convert the binomial probability of a constrained DNM to a fold change."""
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return pi / (1 - pi) * df["exp_u"] / df["exp_c"]
+
+
+def fc_to_prob(fc, df):
+    """Binomial probability of a constrained DNM, for a given fold change."""
+
+    return fc * df["exp_c"] / (fc * df["exp_c"] + df["exp_u"])
+
+
+def delta_method(df, alpha=0.05, h0=1):
+    """Wald interval and test on the log fold change, with Poisson counts."""
+
+    z = stats.norm.isf(alpha / 2)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_fc = np.log(df["fc"])
+        se = np.sqrt(1 / df["obs_c"] + 1 / df["obs_u"])
+        p = 2 * stats.norm.sf(np.abs(log_fc - np.log(h0)) / se)
+
+    return df.assign(
+        fc_ci_lo=np.exp(log_fc - z * se), fc_ci_hi=np.exp(log_fc + z * se), p=p
+    )
+
+
+def binomial_test(df, alpha=0.05, h0=1):
+    """Exact conditional binomial test, with a Clopper-Pearson interval."""
+
+    k, n = df["obs_c"], df["obs_c"] + df["obs_u"]
+    pi0 = fc_to_prob(h0, df)
+
+    pi_lo = np.where(k > 0, stats.beta.ppf(alpha / 2, k, n - k + 1), 0)
+    pi_hi = np.where(k < n, stats.beta.isf(alpha / 2, k + 1, n - k), 1)
+    p = 2 * np.minimum(stats.binom.cdf(k, n, pi0), stats.binom.sf(k - 1, n, pi0))
+
+    return df.assign(
+        fc_ci_lo=odds_to_fc(pi_lo, df),
+        fc_ci_hi=odds_to_fc(pi_hi, df),
+        p=np.minimum(p, 1),
+    )
+
+
+def g_test(df, alpha=0.05, h0=1):
+    """G-test of the constrained / unconstrained split, with a Wald interval."""
+
+    n = df["obs_c"] + df["obs_u"]
+    pi0 = fc_to_prob(h0, df)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        g = 2 * (
+            special.xlogy(df["obs_c"], df["obs_c"] / (n * pi0))
+            + special.xlogy(df["obs_u"], df["obs_u"] / (n * (1 - pi0)))
+        )
+
+    return delta_method(df, alpha, h0).assign(p=stats.chi2.sf(g, 1))
+
+
+_TESTS = {"delta": delta_method, "binomial": binomial_test, "g_test": g_test}
+
+
+def get_statistics(counts, test="binomial", alpha=0.05, h0=1):
+    """Fold change, confidence interval and P value for each group.
+
+    `counts` are the summed counts per stratum, as from
+    `dnms_enrichment.count_variants`.
+    """
+
+    df = pivot_constraint(counts)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df = df.assign(fc=lambda x: (x.obs_c / x.exp_c) / (x.obs_u / x.exp_u))
+
+    return _TESTS[test](df, alpha, h0)[["fc", "fc_ci_lo", "fc_ci_hi", "p"]]
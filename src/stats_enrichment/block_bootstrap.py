@@ -0,0 +1,147 @@
+"""Participant-level (block) bootstrap of DNM enrichment statistics.
+
+One participant can carry several DNMs, so resampling per-transcript rows
+understates the variance of the observed counts. Here, participants are
+resampled instead. A sparse participant x (enst, region, csq) count matrix is
+built once, and collapsed onto the strata. Every GEL trio offspring is a
+participant, with a row of zeros if they have no DNMs, so that trios without
+DNMs are also drawn. Each replicate is then a
+multinomial participant weight vector, and a batch of replicates is one sparse
+x dense matrix product. Expected counts are fixed.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.stats_enrichment import bootstrap
+from src.stats_enrichment import merge_annotations as ma
+from src.stats_enrichment.accumulator import FoldChangeAccumulator
+
+_DNMS_IN = "data/interim/dnms_annotated_clinical.tsv"
+_OFFSPRING = "data/interim/gel_dnm_offspring_clean.tsv"
+_KEYS = ["enst", "region", "csq"]
+
+logger = logging.getLogger(__name__)
+
+
+def read_dnms(path=_DNMS_IN):
+    return pd.read_csv(
+        path, sep="\t", usecols=_KEYS + ["cohort", "participant_id", "id"]
+    )
+
+
+def read_offspring(path=_OFFSPRING):
+    """Cluster labels of all GEL trio offspring, as from `get_clusters`."""
+
+    ids = pd.read_csv(path, sep="\t", usecols=["Participant Id"])["Participant Id"]
+    return ids.astype("Int64").astype(str).unique()
+
+
+def get_clusters(df):
+    """Participant ID for GEL DNMs, or the cohort and individual ID otherwise."""
+
+    gel = df["participant_id"].astype("Int64").astype(str)
+    other = df["cohort"] + "_" + df["id"].astype(str)
+
+    return df.assign(cluster=gel.where(df["participant_id"].notna(), other))
+
+
+def get_cells(df):
+    """Simplify consequences, and count each DNM in its whole transcript too."""
+
+    return df.pipe(ma.unify_truncating_variants).pipe(ma.add_transcript_as_region)
+
+
+def participant_matrix(dnms, counts, offspring=()):
+    """Sparse participant x count row matrix of DNMs.
+
+    Columns are the rows of `counts`. DNMs in cells without expected counts
+    are dropped, as they are when the counts are merged. Participants are the
+    `offspring` clusters, followed by any other clusters with DNMs.
+    """
+
+    rows = counts[_KEYS].reset_index(drop=True).rename_axis("row").reset_index()
+    df = dnms.merge(rows, how="inner", on=_KEYS)
+    labels = pd.Index(offspring).append(pd.Index(df["cluster"])).unique()
+    participants = labels.get_indexer(df["cluster"])
+
+    logger.info(f"DNMs matched to count rows: {len(df)}")
+    logger.info(f"Participants: {len(labels)}")
+    logger.info(f"Participants with a matched DNM: {df['cluster'].nunique()}")
+
+    return sparse.csr_matrix(
+        (np.ones(len(df)), (participants, df["row"])),
+        shape=(len(labels), len(counts)),
+    )
+
+
+def stratum_matrix(counts, grouping):
+    """Sparse indicator matrix of count rows x strata, and the strata index."""
+
+    grouped = counts.groupby(grouping)
+    codes = grouped.ngroup().to_numpy()
+    index = grouped.size().index
+
+    indicator = sparse.csr_matrix(
+        (np.ones(len(codes)), (np.arange(len(codes)), codes)),
+        shape=(len(codes), len(index)),
+    )
+
+    return indicator, index
+
+
+def resample_sums(participants, n_exp, replicates, rng):
+    """Summed (n_exp, n_dnms) per stratum for a batch of replicates.
+
+    `participants` is the (strata x participants) DNM count matrix.
+    """
+
+    weights = bootstrap.resample_counts(participants.shape[1], replicates, rng)
+    dnms_obs = (participants @ weights.T).T
+
+    return np.stack([np.broadcast_to(n_exp, dnms_obs.shape), dnms_obs], axis=-1)
+
+
+def bootstrap_fc_statistics(
+    counts,
+    dnms,
+    grouping,
+    resamples,
+    offspring=(),
+    h0=1,
+    seed=None,
+    max_cells=bootstrap._MAX_CELLS,
+):
+    """Block bootstrap confidence intervals and P values per stratum.
+
+    `offspring` are the cluster labels of all participants, including those
+    without DNMs (see `read_offspring`).
+    """
+
+    indicator, index = stratum_matrix(counts, grouping)
+    matrix = participant_matrix(
+        dnms.pipe(get_clusters).pipe(get_cells), counts, offspring
+    )
+    participants = (matrix @ indicator).T.tocsr()
+    n_exp = indicator.T @ counts["n_exp"].to_numpy(dtype=np.float64)
+
+    observed = np.asarray(participants.sum(axis=1)).ravel()
+    expected = indicator.T @ counts["n_dnms"].to_numpy(dtype=np.float64)
+    if not np.allclose(observed, expected):
+        logger.warning("DNM counts per participant do not sum to the counted DNMs.")
+
+    accumulator = FoldChangeAccumulator(bootstrap.get_fc_index(index), h0=h0)
+    constrained = bootstrap.is_constrained(index)
+    batch_size = max(1, max_cells // participants.shape[1])
+
+    for n, seed_sequence in bootstrap.get_chunks(resamples, seed):
+        rng = np.random.default_rng(seed_sequence)
+        for start in range(0, n, batch_size):
+            sums = resample_sums(participants, n_exp, min(batch_size, n - start), rng)
+            fc = bootstrap.get_statistics(sums, index)["fc"]
+            accumulator.update(fc[:, constrained])
+
+    return accumulator.statistics()
@@ -0,0 +1,448 @@
+"""Vectorised bootstrap of DNM enrichment statistics.
+
+Resampling the per-transcript rows of a stratum with replacement is equivalent
+to drawing a multinomial count vector over those rows. The summed counts of a
+batch of replicates are then a single matrix product of the count matrix with
+the (n_exp, n_dnms) values of the stratum.
+
+Replicates are drawn in fixed-size chunks, each with its own random stream
+spawned from a single seed. Chunks can be run in a pool of worker processes,
+which read the strata from shared memory. The replicates drawn for a given
+seed are the same for any number of workers.
+
+Chunks are either collected into a dataframe of replicates, or summarised as
+they arrive by a `FoldChangeAccumulator`. In the adaptive bootstrap, replicates
+are drawn in rounds, and each stratum stops being resampled once the
+Monte-Carlo error of its confidence limits and P value is within tolerance.
+
+Replicates can also be checkpointed to disk, keyed by the content of the input
+file, the grouping and the seed. Later runs reuse the saved replicates, and
+only draw the chunks which are missing.
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.stats_enrichment.accumulator import FoldChangeAccumulator
+
+_MAX_CELLS = 2**24  # Largest resampling count matrix held in memory at once
+_CHUNK_SIZE = 250  # Replicates per independently seeded chunk
+_ROUND_SIZE = 1000  # Replicates per round of the adaptive bootstrap
+_CI_TOL = 0.02  # Monte-Carlo standard error tolerated in each confidence limit
+_P_TOL = 0.005  # Monte-Carlo standard error tolerated in each P value
+_CHECKPOINT_DIR = "data/interim/bootstrap"
+
+Strata = collections.namedtuple("Strata", ["index", "values", "offsets"])
+
+logger = logging.getLogger(__name__)
+
+_worker = {}  # Strata attached from shared memory, in each worker process
+
+
+def get_strata(df, grouping):
+    """Sort per-transcript counts by stratum.
+
+    The rows of stratum i are values[offsets[i]:offsets[i + 1]], and the strata
+    are in the same order as the groups of `count_variants`.
+    """
+
+    grouped = df.groupby(grouping)
+    sizes = grouped.size()
+    order = np.argsort(grouped.ngroup().to_numpy(), kind="stable")
+    values = df[["n_exp", "n_dnms"]].to_numpy(dtype=np.float64)[order]
+    offsets = np.concatenate([[0], np.cumsum(sizes.to_numpy())])
+
+    return Strata(sizes.index, values, offsets)
+
+
+def subset_strata(strata, keep):
+    """Select strata with a boolean mask."""
+
+    lo, hi = strata.offsets[:-1][keep], strata.offsets[1:][keep]
+    rows = np.concatenate([np.arange(a, b) for a, b in zip(lo, hi)])
+    offsets = np.concatenate([[0], np.cumsum(hi - lo)])
+
+    return Strata(strata.index[keep], strata.values[rows], offsets)
+
+
+def get_batch_size(offsets, max_cells=_MAX_CELLS):
+    """Number of replicates per batch, given the size of the largest stratum."""
+
+    return max(1, max_cells // int(np.diff(offsets).max()))
+
+
+def resample_counts(size, replicates, rng):
+    """Multinomial counts of each of `size` rows, for a batch of replicates."""
+
+    draws = rng.integers(0, size, size=(replicates, size))
+    draws += np.arange(replicates)[:, None] * size
+
+    return np.bincount(draws.ravel(), minlength=replicates * size).reshape(
+        replicates, size
+    )
+
+
+def resample_sums(strata, replicates, rng):
+    """Summed (n_exp, n_dnms) per stratum for a batch of bootstrap replicates.
+
+    Returns an array with shape (replicates, strata, 2).
+    """
+
+    offsets = strata.offsets
+    sums = np.empty((replicates, len(offsets) - 1, 2))
+
+    for i, (lo, hi) in enumerate(zip(offsets[:-1], offsets[1:])):
+        counts = resample_counts(hi - lo, replicates, rng)
+        sums[:, i, :] = counts @ strata.values[lo:hi]
+
+    return sums
+
+
+def get_groups(index, drop="constraint"):
+    """Group codes of each stratum, and the position of its reference stratum.
+
+    Strata are grouped by all levels of the index except `drop`. The reference
+    stratum of each group is the unconstrained one; where a group has no
+    unconstrained stratum, its reference is -1.
+    """
+
+    codes, groups = index.droplevel(drop).factorize()
+
+    reference = np.full(len(groups), -1)
+    unconstrained = index.get_level_values(drop) == "unconstrained"
+    reference[codes[unconstrained]] = np.flatnonzero(unconstrained)
+
+    return codes, reference[codes]
+
+
+def get_statistics(sums, index):
+    """Enrichment statistics for every replicate at once.
+
+    Mirrors `dnms_enrichment.get_statistics`, with the strata along the last
+    axis of each array.
+    """
+
+    codes, reference = get_groups(index)
+    indicator = np.eye(codes.max() + 1)[codes]
+    group_sum = lambda x: (x @ indicator)[..., codes]
+
+    gnomad_exp, dnms_obs = sums[..., 0], sums[..., 1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        prop_exp = gnomad_exp / group_sum(gnomad_exp)
+        dnms_exp = prop_exp * group_sum(dnms_obs)
+        oe = dnms_obs / dnms_exp
+        oe_reference = np.concatenate(
+            [oe, np.full(oe.shape[:-1] + (1,), np.nan)], axis=-1
+        )[..., reference]
+        fc = oe / oe_reference
+
+    return dict(
+        gnomad_exp=gnomad_exp,
+        dnms_obs=dnms_obs,
+        prop_exp=prop_exp,
+        dnms_exp=dnms_exp,
+        oe=oe,
+        fc=fc,
+    )
+
+
+def is_constrained(index):
+    return index.get_level_values("constraint") == "constrained"
+
+
+def get_fc_index(index):
+    """Index of the constrained strata, as returned by `dnms_enrichment.get_fc`."""
+
+    return index[is_constrained(index)].droplevel("constraint")
+
+
+def get_chunks(resamples, seed=None, start=0, chunk_size=_CHUNK_SIZE):
+    """Split replicates into chunks, each with an independent random stream.
+
+    The seed may be an integer, None, or a `SeedSequence`. Chunks before
+    `start` are skipped, so that the remaining chunks have the same streams
+    as in a run from zero.
+    """
+
+    if isinstance(seed, np.random.SeedSequence):
+        seed_sequence = seed
+    else:
+        seed_sequence = np.random.SeedSequence(seed)
+
+    logger.info(f"Bootstrap seed entropy: {seed_sequence.entropy}")
+
+    first = start // chunk_size
+    sizes = [
+        min(chunk_size, resamples - i)
+        for i in range(first * chunk_size, resamples, chunk_size)
+    ]
+
+    return list(zip(sizes, seed_sequence.spawn(first + len(sizes))[first:]))
+
+
+def bootstrap_chunk(strata, replicates, seed_sequence, batch_size):
+    """Bootstrap fold changes of constrained strata for one chunk of replicates."""
+
+    rng = np.random.default_rng(seed_sequence)
+    constrained = is_constrained(strata.index)
+
+    return np.concatenate(
+        [
+            get_statistics(
+                resample_sums(strata, min(batch_size, replicates - start), rng),
+                strata.index,
+            )["fc"][:, constrained]
+            for start in range(0, replicates, batch_size)
+        ]
+    )
+
+
+def share_array(array):
+    """Copy an array to a new block of shared memory."""
+
+    shm = shared_memory.SharedMemory(create=True, size=array.nbytes)
+    np.ndarray(array.shape, array.dtype, buffer=shm.buf)[:] = array
+
+    return shm
+
+
+def attach_array(name, shape, dtype):
+    """Read an array from an existing block of shared memory."""
+
+    shm = shared_memory.SharedMemory(name=name)
+    _worker.setdefault("shm", []).append(shm)  # Keep the buffer alive
+
+    return np.ndarray(shape, dtype, buffer=shm.buf)
+
+
+def init_worker(index, values, offsets):
+    """Attach the strata in shared memory to a worker process."""
+
+    _worker["strata"] = Strata(index, attach_array(*values), attach_array(*offsets))
+
+
+def run_chunk(replicates, seed_sequence, batch_size):
+    return bootstrap_chunk(_worker["strata"], replicates, seed_sequence, batch_size)
+
+
+def bootstrap_parallel(strata, chunks, batch_size, workers):
+    """Bootstrap chunks of replicates in a pool of worker processes.
+
+    Chunks are yielded in order, as they complete.
+    """
+
+    arrays = [strata.values, strata.offsets]
+    shared = [share_array(a) for a in arrays]
+
+    try:
+        specs = [(shm.name, a.shape, a.dtype) for shm, a in zip(shared, arrays)]
+        with ProcessPoolExecutor(
+            workers, initializer=init_worker, initargs=(strata.index, *specs)
+        ) as executor:
+            sizes, seeds = zip(*chunks)
+            yield from executor.map(run_chunk, sizes, seeds, repeat(batch_size))
+    finally:
+        for shm in shared:
+            shm.close()
+            shm.unlink()
+
+
+def bootstrap_chunks(
+    strata, resamples, seed=None, start=0, workers=1, max_cells=_MAX_CELLS
+):
+    """Yield bootstrapped fold changes, one chunk of replicates at a time."""
+
+    batch_size = get_batch_size(strata.offsets, max_cells)
+    chunks = get_chunks(resamples, seed, start)
+
+    logger.info(
+        f"Bootstrapping {resamples - start} replicates of {len(strata.index)} strata "
+        f"in {len(chunks)} chunks, with {workers} worker(s)."
+    )
+
+    if workers > 1:
+        yield from bootstrap_parallel(strata, chunks, batch_size, workers)
+    else:
+        for n, seed_sequence in chunks:
+            yield bootstrap_chunk(strata, n, seed_sequence, batch_size)
+
+
+def bootstrap_fc(df, grouping, resamples, **kwargs):
+    """Bootstrap the fold change of each stratum, with one column per replicate."""
+
+    strata = get_strata(df, grouping)
+    fc = np.concatenate(list(bootstrap_chunks(strata, resamples, **kwargs)))
+
+    return pd.DataFrame(fc.T, index=get_fc_index(strata.index))
+
+
+def bootstrap_fc_statistics(df, grouping, resamples, h0=1, **kwargs):
+    """Bootstrap confidence intervals and P values, accumulating each chunk."""
+
+    strata = get_strata(df, grouping)
+    accumulator = FoldChangeAccumulator(get_fc_index(strata.index), h0=h0)
+
+    for fc in bootstrap_chunks(strata, resamples, **kwargs):
+        accumulator.update(fc)
+
+    return accumulator.statistics()
+
+
+def file_digest(path):
+    """SHA-256 digest of the content of a file."""
+
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def checkpoint_path(path_in, grouping, seed, directory=_CHECKPOINT_DIR):
+    """Path to the saved replicates for an input file, grouping and seed."""
+
+    key = json.dumps([file_digest(path_in), list(grouping), seed, _CHUNK_SIZE])
+    key = hashlib.sha256(key.encode()).hexdigest()[:16]
+
+    return Path(directory) / f"fc_{'_'.join(grouping)}_{key}.npy"
+
+
+def read_replicates(path, n_strata):
+    """Read saved replicates."""
+
+    if not Path(path).exists():
+        return np.empty((0, n_strata))
+
+    fc = np.load(path, mmap_mode="r")
+    assert fc.shape[1] == n_strata, "Saved replicates do not match the strata."
+
+    return fc
+
+
+def reusable_replicates(fc, resamples, chunk_size=_CHUNK_SIZE):
+    """Saved replicates which are the same as in a run of `resamples` replicates.
+
+    A run draws a shorter final chunk where `resamples` is not a multiple of the
+    chunk size. Its replicates differ from those of a whole chunk, so a saved
+    final chunk is only reused where it has the same size.
+    """
+
+    if len(fc) == resamples:
+        return fc
+
+    return fc[: min(len(fc), resamples) // chunk_size * chunk_size]
+
+
+def write_replicates(fc, path):
+    """Save replicates, replacing any earlier file only once fully written."""
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+
+    with open(tmp, "wb") as f:
+        np.save(f, fc)
+
+    os.replace(tmp, path)
+
+    return fc
+
+
+def bootstrap_fc_checkpoint(df, grouping, resamples, path, seed, **kwargs):
+    """Bootstrap fold changes, reusing and extending replicates saved to disk.
+
+    Exactly `resamples` replicates are returned, and they are the same whether
+    or not any replicates were saved. Saved replicates are only replaced by a
+    longer run.
+    """
+
+    assert seed is not None, "Checkpointed replicates need a seed."
+
+    strata = get_strata(df, grouping)
+    fc_index = get_fc_index(strata.index)
+    saved = read_replicates(path, len(fc_index))
+    fc = reusable_replicates(saved, resamples)
+
+    logger.info(f"Saved replicates in {path}: {len(saved)}, reused: {len(fc)}")
+
+    if len(fc) < resamples:
+        chunks = bootstrap_chunks(strata, resamples, seed=seed, start=len(fc), **kwargs)
+        fc = np.concatenate([fc, *chunks])
+
+        if len(fc) > len(saved):
+            write_replicates(fc, path)
+
+    return pd.DataFrame(fc[:resamples].T, index=fc_index)
+
+
+def bootstrap_fc_adaptive(
+    df,
+    grouping,
+    max_resamples=10000,
+    min_resamples=_ROUND_SIZE,
+    round_size=_ROUND_SIZE,
+    ci_tol=_CI_TOL,
+    p_tol=_P_TOL,
+    h0=1,
+    seed=None,
+    **kwargs,
+):
+    """Bootstrap in rounds, until each stratum's Monte-Carlo error is in tolerance.
+
+    Only the strata of groups which have not yet converged are resampled in
+    each round. The number of replicates and the Monte-Carlo errors of each
+    stratum are returned alongside its confidence interval and P value.
+    """
+
+    strata = get_strata(df, grouping)
+    accumulator = FoldChangeAccumulator(get_fc_index(strata.index), h0=h0)
+
+    codes, _ = get_groups(strata.index)
+    fc_codes = codes[is_constrained(strata.index)]
+    active = np.ones(len(fc_codes), dtype=bool)
+
+    n_rounds = -(-max_resamples // round_size)
+    rounds = np.random.SeedSequence(seed).spawn(n_rounds)
+
+    for i, round_seed in enumerate(rounds):
+        drawn = i * round_size
+        keep = np.isin(codes, fc_codes[active])
+
+        for fc in bootstrap_chunks(
+            subset_strata(strata, keep),
+            min(round_size, max_resamples - drawn),
+            seed=round_seed,
+            **kwargs,
+        ):
+            accumulator.update(fc, strata=np.flatnonzero(active))
+
+        if drawn + round_size < min_resamples:
+            continue
+
+        errors = accumulator.mc_errors()
+        converged = (
+            (errors["fc_ci_lo_mcse"] <= ci_tol)
+            & (errors["fc_ci_hi_mcse"] <= ci_tol)
+            & (errors["p_mcse"] <= p_tol)
+        ).to_numpy()
+        active &= ~converged
+
+        logger.info(f"Strata still resampling after round {i + 1}: {active.sum()}")
+
+        if not active.any():
+            break
+
+    return pd.concat([accumulator.statistics(), accumulator.mc_errors()], axis=1)
@@ -0,0 +1,97 @@
+"""Compare analytic enrichment statistics with the bootstrapped statistics."""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+import src
+from src.stats_enrichment import count_cube
+from src.stats_enrichment import dnms_enrichment as de
+
+_CUBE_IN = "data/interim/dnms_enrichment_counts.npz"
+_GENE_SETS = ["_all_genes", "_ad", "_ar", "_non_morbid"]
+_TESTS = ["delta", "binomial", "g_test"]
+_FILE_OUT = "data/statistics/dnms_enrichment_method_comparison.tsv"
+
+logger = logging.getLogger(__name__)
+
+
+def read_bootstrap(label):
+    return pd.read_csv(de.get_path(label), sep="\t", index_col="csq")
+
+
+def get_analytic(cube, test):
+    """Analytic statistics for every gene set, in the same layout as `main`."""
+
+    all_genes = de.get_dnms_enrichment(
+        None, ["csq", "region", "constraint"], method="analytic", cube=cube, test=test
+    ).pipe(de.tidy_index)
+    omim_genes = de.get_dnms_enrichment(
+        None,
+        ["csq", "region", "inheritance_simple", "constraint"],
+        method="analytic",
+        cube=cube,
+        test=test,
+    )
+    moi = ["AD", "AR", "non_morbid"]
+
+    return [all_genes] + [de.separate_omim_categories(omim_genes, m) for m in moi]
+
+
+def compare(bootstrap, analytic):
+    """Side-by-side statistics, with log2 ratios of the interval limits."""
+
+    columns = ["fc_ci_lo", "fc_ci_hi", "p"]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = np.log2(analytic[columns[:2]] / bootstrap[columns[:2]])
+
+    return pd.concat(
+        [
+            bootstrap[["fc"]],
+            bootstrap[columns].add_suffix("_bootstrap"),
+            analytic[columns].add_suffix("_analytic"),
+            ratios.add_prefix("log2_ratio_"),
+            (analytic["p"] < 0.05).eq(bootstrap["p"] < 0.05).rename("same_call"),
+        ],
+        axis=1,
+    )
+
+
+def write_out(df, path):
+    df.to_csv(path, sep="\t")
+    return df
+
+
+def main():
+    """Run as script."""
+
+    cube = count_cube.read_cube(_CUBE_IN)
+    bootstrap = [read_bootstrap(label) for label in _GENE_SETS]
+
+    comparisons = []
+    for test in _TESTS:
+        analytic = get_analytic(cube, test)
+        comparisons += [
+            compare(b, a).assign(gene_set=label.strip("_"), test=test)
+            for b, a, label in zip(bootstrap, analytic, _GENE_SETS)
+        ]
+
+    df = pd.concat(comparisons).set_index(["test", "gene_set"], append=True)
+
+    logger.info(
+        "Median absolute log2 ratio of analytic to bootstrap limits:\n"
+        f"{df.filter(like='log2_ratio').abs().groupby(level='test').median()}"
+    )
+    logger.info(
+        "Strata with the same call at P < 0.05:\n"
+        f"{df.groupby(level='test').same_call.mean()}"
+    )
+
+    return write_out(df, _FILE_OUT)
+
+
+if __name__ == "__main__":
+    logger = src.setup_logger(src.log_file(__file__))
+    main()
@@ -0,0 +1,87 @@
+"""Summed expected and observed counts for every stratum, as an N-dimensional cube.
+
+The cube has one axis per annotation (csq, region, constraint and
+inheritance_simple), with sorted labels. Counts for any grouping of these
+annotations are found by summing over the remaining axes.
+"""
+
+import collections
+import logging
+
+import numpy as np
+import pandas as pd
+
+_AXES = ["csq", "region", "constraint", "inheritance_simple"]
+
+Cube = collections.namedtuple("Cube", ["axes", "n_exp", "n_dnms", "n_rows"])
+
+logger = logging.getLogger(__name__)
+
+
+def build_cube(df, axes=_AXES):
+    """Sum per-transcript counts into a cube.
+
+    Rows with any missing value are dropped, as in `dnms_enrichment.main`.
+    """
+
+    df = df.dropna()
+    codes, labels = zip(*[pd.factorize(df[a], sort=True) for a in axes])
+    shape = tuple(len(l) for l in labels)
+    flat = np.ravel_multi_index(codes, shape)
+
+    def cube_sum(weights=None):
+        return np.bincount(flat, weights, minlength=np.prod(shape)).reshape(shape)
+
+    cube = Cube(
+        axes={a: np.asarray(l, dtype=str) for a, l in zip(axes, labels)},
+        n_exp=cube_sum(df["n_exp"]),
+        n_dnms=cube_sum(df["n_dnms"]),
+        n_rows=cube_sum().astype(np.int64),
+    )
+
+    logger.info(f"Count cube axes: {dict(zip(axes, shape))}")
+
+    return cube
+
+
+def write_cube(cube, path):
+    np.savez_compressed(
+        path,
+        axis_names=np.array(list(cube.axes), dtype=str),
+        **{f"axis_{a}": l for a, l in cube.axes.items()},
+        n_exp=cube.n_exp,
+        n_dnms=cube.n_dnms,
+        n_rows=cube.n_rows,
+    )
+    return cube
+
+
+def read_cube(path):
+    with np.load(path, allow_pickle=False) as f:
+        axes = {a: f[f"axis_{a}"] for a in f["axis_names"]}
+        return Cube(axes, f["n_exp"], f["n_dnms"], f["n_rows"])
+
+
+def count_variants(cube, grouping):
+    """Summed counts per group, as `dnms_enrichment.count_variants`.
+
+    Groups without any transcripts are dropped, as they are by `groupby`.
+    """
+
+    names = list(cube.axes)
+    kept = [a for a in names if a in grouping]
+    other = tuple(i for i, a in enumerate(names) if a not in grouping)
+    order = [kept.index(a) for a in grouping]
+
+    def axis_sum(array):
+        return array.sum(axis=other).transpose(order).ravel()
+
+    index = pd.MultiIndex.from_product(
+        [cube.axes[a] for a in grouping], names=grouping
+    )
+    df = pd.DataFrame(
+        {"gnomad_exp": axis_sum(cube.n_exp), "dnms_obs": axis_sum(cube.n_dnms)},
+        index=index,
+    )
+
+    return df[axis_sum(cube.n_rows) > 0]
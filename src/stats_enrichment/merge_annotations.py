@@ -7,6 +7,7 @@ import pandas as pd
 
 import src
 from src.merge_annotations import dnms_annotate_constraint as dac
+from src.stats_enrichment import count_cube
 
 _DNMS_ANNOTATED = "data/interim/dnms_annotated.tsv"
 _REGIONAL_NONSENSE_CONSTRAINT = "data/uom_csf/regional_nonsense_constraint.tsv"
@@ -14,6 +15,7 @@ _REGIONAL_CONSTRAINT_STATS = "data/uom_csf/regional_constraint_stats.tsv"
 _GENE_IDS = "data/uom_csf/gene_ids.tsv"
 _GENEMAP2_SIMPLE = "data/uom_csf/genemap2_simple.tsv"
 _FILE_OUT = "data/interim/dnms_enrichment_counts.tsv"
+_CUBE_OUT = "data/interim/dnms_enrichment_counts.npz"
 
 logger = logging.getLogger(__name__)
 
@@ -67,6 +69,11 @@ def write_out(df, path):
     return df
 
 
+def write_cube(df, path):
+    count_cube.write_cube(count_cube.build_cube(df), path)
+    return df
+
+
 def main():
     """Run as script."""
 
@@ -96,6 +103,7 @@ def main():
         .fillna({"inheritance_simple": "non_morbid"})
         .pipe(reorder_data)
         .pipe(write_out, _FILE_OUT)
+        .pipe(write_cube, _CUBE_OUT)
     )
 
 
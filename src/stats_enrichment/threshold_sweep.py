@@ -0,0 +1,140 @@
+"""Enrichment fold changes over a grid of allele frequency filter thresholds.
+
+Each DNM is binned by the tightest threshold it passes on each filter, and the
+bins are counted per stratum. Cumulative sums of these counts along each
+filter axis then give the DNMs passing every combination of thresholds, and
+the fold changes of all combinations are found at once. Expected counts do
+not depend on the thresholds.
+
+The annotated DNMs have already been filtered by `annotate_dnms.filter_and_tidy`
+(ac_gnomad <= 1, af_gnomad <= 1e-4 and ac_gel <= 5), so the grid only holds
+thresholds at or tighter than those limits. The loosest combination gives the
+counts of the main analysis.
+"""
+
+import itertools
+import logging
+
+import numpy as np
+import pandas as pd
+
+import src
+from src.stats_enrichment import block_bootstrap, bootstrap
+from src.stats_enrichment import dnms_enrichment as de
+
+_FILE_IN = "data/interim/dnms_enrichment_counts.tsv"
+_DNMS_IN = "data/interim/dnms_annotated.tsv"
+_KEYS = ["enst", "region", "csq"]
+_THRESHOLDS = {  # Loosest values are the limits of filter_and_tidy
+    "ac_gnomad": [0, 1],
+    "af_gnomad": [1e-6, 5e-6, 1e-5, 5e-5, 1e-4],
+    "ac_gel": [1, 2, 3, 4, 5],
+}
+_FILE_OUT = "data/statistics/dnms_enrichment_threshold_sweep.tsv"
+
+logger = logging.getLogger(__name__)
+
+
+def read_dnms(path, filters=_THRESHOLDS):
+    return pd.read_csv(path, sep="\t", usecols=_KEYS + list(filters))
+
+
+def threshold_bins(values, grid):
+    """Position of the tightest threshold in `grid` which each value passes.
+
+    Values above every threshold are given len(grid). Missing values pass
+    every threshold, as in `filter_and_tidy`.
+    """
+
+    bins = np.searchsorted(grid, values, side="left")
+    return np.where(np.isnan(values), 0, bins)
+
+
+def get_strata(dnms, counts, grouping):
+    """Stratum of each DNM, and the strata index, as from `count_variants`."""
+
+    indicator, index = block_bootstrap.stratum_matrix(counts, grouping)
+    rows = counts[_KEYS].reset_index(drop=True).rename_axis("row").reset_index()
+    df = dnms.merge(rows, on=_KEYS)
+    strata = indicator.indices[df["row"].to_numpy()]
+
+    logger.info(f"DNMs matched to count rows: {len(df)}")
+
+    return df, strata, indicator, index
+
+
+def count_passing(strata, bins, n_strata, shape):
+    """DNMs per stratum passing each combination of thresholds.
+
+    Returns an array of shape (n_strata, *shape).
+    """
+
+    full = (n_strata,) + tuple(s + 1 for s in shape)
+    flat = np.ravel_multi_index((strata, *bins), full)
+    counts = np.bincount(flat, minlength=np.prod(full)).reshape(full)
+
+    for axis in range(1, len(full)):
+        counts = counts.cumsum(axis=axis)
+
+    return counts[(slice(None),) + tuple(slice(s) for s in shape)]
+
+
+def sweep_thresholds(dnms, counts, grouping, thresholds=_THRESHOLDS):
+    """Fold change and constrained DNM count for every threshold combination."""
+
+    dnms = dnms.pipe(block_bootstrap.get_cells)
+    df, strata, indicator, index = get_strata(dnms, counts, grouping)
+
+    grids = [np.sort(g) for g in thresholds.values()]
+    shape = tuple(len(g) for g in grids)
+    bins = [
+        threshold_bins(df[f].to_numpy(dtype=float), g)
+        for f, g in zip(thresholds, grids)
+    ]
+
+    passing = count_passing(strata, bins, len(index), shape)
+    dnms_obs = passing.reshape(len(index), -1).T
+    n_exp = indicator.T @ counts["n_exp"].to_numpy(dtype=np.float64)
+    sums = np.stack([np.broadcast_to(n_exp, dnms_obs.shape), dnms_obs], axis=-1)
+
+    statistics = bootstrap.get_statistics(sums, index)
+    constrained = bootstrap.is_constrained(index)
+    fc_index = bootstrap.get_fc_index(index)
+
+    combinations = pd.MultiIndex.from_tuples(
+        itertools.product(*grids), names=list(thresholds)
+    )
+
+    logger.info(f"Threshold combinations: {len(combinations)}")
+
+    return pd.DataFrame(
+        {
+            "dnms_obs": statistics["dnms_obs"][:, constrained].ravel(),
+            "fc": statistics["fc"][:, constrained].ravel(),
+        },
+        index=pd.MultiIndex.from_tuples(
+            [c + s for c in combinations for s in fc_index],
+            names=combinations.names + fc_index.names,
+        ),
+    )
+
+
+def write_out(df, path):
+    df.to_csv(path, sep="\t")
+    return df
+
+
+def main():
+    """Run as script."""
+
+    counts = de.read_data(_FILE_IN).dropna()
+    dnms = read_dnms(_DNMS_IN)
+
+    return sweep_thresholds(dnms, counts, ["csq", "region", "constraint"]).pipe(
+        write_out, _FILE_OUT
+    )
+
+
+if __name__ == "__main__":
+    logger = src.setup_logger(src.log_file(__file__))
+    main()
@@ -0,0 +1,160 @@
+"""Update enrichment counts with a batch of newly annotated or retracted DNMs.
+
+DNM counts are pure sums, so a delta of new DNMs is added to (and retracted
+DNMs are subtracted from) the persisted per-(enst, region, csq) counts. The
+expected counts from gnomAD are left untouched. Enrichment statistics are then
+recomputed only for the strata containing changed counts.
+
+The delta is relative to the counts written by `merge_annotations`, which are
+not modified. Updated counts and enrichment tables are written to separate
+`_updated` files, so that running the update again gives the same result, and
+the outputs of the full pipeline stay consistent with each other. Affected
+strata are bootstrapped with the checkpointed estimator of
+`dnms_enrichment.main`, with the same seed and number of replicates.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+import src
+from src.stats_enrichment import bootstrap, count_cube
+from src.stats_enrichment import dnms_enrichment as de
+from src.stats_enrichment import merge_annotations as ma
+
+_DELTA_IN = "data/interim/dnms_annotated_delta.tsv"
+_COUNTS = "data/interim/dnms_enrichment_counts.tsv"
+_COUNTS_OUT = "data/interim/dnms_enrichment_counts_updated.tsv"
+_CUBE_OUT = "data/interim/dnms_enrichment_counts_updated.npz"
+_KEYS = ["enst", "region", "csq"]
+_GROUP_ALL_GENES = ["csq", "region", "constraint"]
+_GROUP_OMIM_GENES = ["csq", "region", "inheritance_simple", "constraint"]
+_MOI = ["AD", "AR", "non_morbid"]
+
+logger = logging.getLogger(__name__)
+
+
+def read_delta(path):
+    """Read a delta of DNMs, with a status of "added" or "retracted"."""
+
+    df = pd.read_csv(path, sep="\t", usecols=_KEYS + ["status"])
+
+    assert df["status"].isin(["added", "retracted"]).all(), "Unknown DNM status."
+    logger.info(f"DNMs in delta by status:\n{df.status.value_counts()}")
+
+    return df
+
+
+def count_delta(df):
+    """Signed change in DNM count per (enst, region, csq)."""
+
+    return (
+        df.pipe(ma.unify_truncating_variants)
+        .pipe(ma.add_transcript_as_region)
+        .assign(n_dnms=lambda x: np.where(x["status"] == "retracted", -1, 1))
+        .groupby(_KEYS)
+        .agg(delta=("n_dnms", "sum"))
+        .reset_index()
+        .query("delta != 0")
+    )
+
+
+def read_counts(path):
+    return pd.read_csv(path, sep="\t")
+
+
+def apply_delta(counts, delta):
+    """Add DNM count changes to the persisted counts.
+
+    Changes to transcripts and regions without expected counts are dropped, as
+    they are when the counts are first merged. Returns the updated counts, and
+    a mask of the rows which changed.
+    """
+
+    df = counts.merge(delta, how="left", on=_KEYS, validate="1:1")
+    touched = df["delta"].notna().to_numpy()
+
+    logger.info(f"Count rows changed by the delta: {touched.sum()}")
+    logger.info(f"Delta rows without expected counts: {len(delta) - touched.sum()}")
+
+    df = df.assign(n_dnms=lambda x: x.n_dnms + x.delta.fillna(0)).drop(
+        "delta", axis=1
+    )
+
+    assert (df["n_dnms"] >= 0).all(), "Retracted DNMs were never counted."
+
+    return df, touched
+
+
+def get_affected(counts, touched, grouping):
+    """All rows in the groups (of both constraint levels) with changed counts."""
+
+    groups = [g for g in grouping if g != "constraint"]
+    affected = counts.loc[touched].dropna()[groups].drop_duplicates()
+
+    return counts.dropna().merge(affected, how="inner")
+
+
+def recompute(counts, touched, grouping):
+    """Enrichment statistics for the affected groups, with the settings of `main`.
+
+    Replicates are checkpointed against the updated counts file.
+    """
+
+    affected = get_affected(counts, touched, grouping)
+
+    n_strata = len(affected[grouping].drop_duplicates())
+    logger.info(f"Strata affected for grouping {grouping}: {n_strata}")
+
+    return de.get_dnms_enrichment(
+        affected,
+        grouping,
+        bootstrap_samples=de._BOOTSTRAP_SAMPLES,
+        seed=de._SEED,
+        workers=de._WORKERS,
+        checkpoint=bootstrap.checkpoint_path(_COUNTS_OUT, grouping, de._SEED),
+    )
+
+
+def update_table(new, label):
+    """Write an enrichment table with its affected rows replaced by recomputed rows.
+
+    The table written by `dnms_enrichment` is read, and the updated table is
+    written beside it, with an `_updated` suffix.
+    """
+
+    df = pd.read_csv(de.get_path(label), sep="\t", index_col="csq")
+    new = new.pipe(de.tidy_partial_index)
+    df.loc[new.index, new.columns] = new
+
+    path = de.get_path(f"{label}_updated")
+    logger.info(f"Rows updated in {path}: {len(new)}")
+
+    return de.write_out(df, path)
+
+
+def main():
+    """Run as script."""
+
+    delta = read_delta(_DELTA_IN).pipe(count_delta)
+    counts, touched = apply_delta(read_counts(_COUNTS), delta)
+
+    ma.write_out(counts, _COUNTS_OUT)
+    ma.write_cube(counts, _CUBE_OUT)
+
+    all_genes = recompute(counts, touched, _GROUP_ALL_GENES)
+    update_table(all_genes, "_all_genes")
+
+    omim_genes = recompute(counts, touched, _GROUP_OMIM_GENES)
+    moi = omim_genes.index.get_level_values("inheritance_simple")
+    for m in _MOI:
+        new = omim_genes[moi == m].droplevel("inheritance_simple")
+        update_table(new, f"_{m.lower()}")
+
+    return counts
+
+
+if __name__ == "__main__":
+    logger = src.setup_logger(src.log_file(__file__))
+    main()
@@ -0,0 +1,178 @@
+"""Packed integer keys of variants, for fast joins and deduplication.
+
+A variant (chr, pos, ref, alt) is packed into a non-negative 64-bit integer:
+
+    bits 58-62  contig code (1-22, X, Y, M as 1-25)
+    bits 30-57  position
+    bit  29     hashed allele flag
+    bits 0-28   allele code
+
+Where the alleles have 11 or fewer bases in total, all of them A/C/G/T, they
+are encoded exactly, as their lengths and two bits per base. Other alleles
+(long indels), and variants on other contigs, are given a hashed code instead,
+which is recorded in a side table. Distinct alleles with the same hash are
+detected there, and the later one is moved to the next free code. Keys with
+hashed codes can only be compared if they come from the same `VariantKeys`, or
+from one made from its saved `codes`.
+"""
+
+import logging
+import threading
+import zlib
+
+import numpy as np
+import pandas as pd
+
+_CONTIGS = [str(c) for c in range(1, 23)] + ["X", "Y", "M"]
+_PRIMARY = set(_CONTIGS)
+_POS_BITS = 28
+_ALLELE_BITS = 29
+_LENGTH_BITS = 3
+_HASHED = 1 << _ALLELE_BITS
+_BASES = {"A": 0, "C": 1, "G": 2, "T": 3}
+_COLUMNS = ["chr", "pos", "ref", "alt"]
+
+logger = logging.getLogger(__name__)
+
+
+def encode_contigs(chrom):
+    """Contig codes from 1, with or without a "chr" prefix. Others are zero."""
+
+    contigs = contig_names(chrom)
+    return pd.Categorical(contigs, categories=_CONTIGS).codes.astype(np.int64) + 1
+
+
+def contig_names(chrom):
+    """Contig names without a "chr" prefix."""
+
+    return pd.Series(chrom, dtype=str).str.replace("^chr", "", regex=True)
+
+
+def encode_exact(ref, alt):
+    """Exact allele code of short A/C/G/T alleles, or None."""
+
+    bases = ref + alt
+    max_length = 2**_LENGTH_BITS - 1
+
+    if max(len(ref), len(alt)) > max_length or not set(bases) <= set(_BASES):
+        return None
+    if 2 * _LENGTH_BITS + 2 * len(bases) > _ALLELE_BITS:
+        return None
+
+    code = (len(ref) << _LENGTH_BITS) | len(alt)
+    for base in bases:
+        code = (code << 2) | _BASES[base]
+
+    return code
+
+
+class VariantKeys:
+    """Encoder of variant keys, with a side table of hashed allele codes.
+
+    The side table may be shared by threads.
+    """
+
+    def __init__(self, codes=()):
+        self.codes = dict(codes)  # Allele string: hashed code
+        self.alleles = {c: a for a, c in self.codes.items()}  # Hashed code: string
+        self.lock = threading.Lock()
+
+    def encode_hashed(self, alleles):
+        """Hashed code of an allele string, checked for collisions."""
+
+        if alleles in self.codes:
+            return self.codes[alleles]
+
+        with self.lock:
+            if alleles in self.codes:
+                return self.codes[alleles]
+
+            code = zlib.crc32(alleles.encode()) % _HASHED
+            while code in self.alleles:
+                logger.warning(
+                    f"Allele hash collision: {alleles} and {self.alleles[code]}"
+                )
+                code = (code + 1) % _HASHED
+
+            self.codes[alleles] = code
+            self.alleles[code] = alleles
+
+        return code
+
+    def encode_alleles(self, contig, ref, alt):
+        """Allele code on a contig, named without a "chr" prefix."""
+
+        code = encode_exact(ref, alt) if contig in _PRIMARY else None
+
+        if code is None:
+            return _HASHED | self.encode_hashed(f"{contig}:{ref}>{alt}")
+
+        return code
+
+    def encode(self, df, columns=_COLUMNS):
+        """Keys of the variants in the `columns` of a dataframe."""
+
+        if len(df) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        chrom, pos, ref, alt = [df[c] for c in columns]
+        names = contig_names(chrom)
+        contigs = encode_contigs(names)
+        pos = pos.to_numpy(dtype=np.int64)
+
+        assert ((pos >= 0) & (pos < 2**_POS_BITS)).all(), "Positions exceed 28 bits."
+
+        # Each distinct (contig, ref, alt) is encoded once. Alleles on other
+        # contigs are hashed with the contig name, as their contig codes are all 0.
+        codes, unique = pd.MultiIndex.from_arrays(
+            [names, ref.astype(str), alt.astype(str)]
+        ).factorize()
+        allele_codes = np.array([self.encode_alleles(*u) for u in unique], np.int64)
+
+        return (
+            (contigs << (_POS_BITS + _ALLELE_BITS + 1))
+            | (pos << (_ALLELE_BITS + 1))
+            | allele_codes[codes]
+        )
+
+
+def isin(keys, other):
+    """Whether each key is in `other`."""
+
+    other = np.unique(other)
+
+    if len(other) == 0:
+        return np.zeros(len(keys), dtype=bool)
+
+    i = np.searchsorted(other, keys).clip(max=len(other) - 1)
+
+    return other[i] == keys
+
+
+def join(left, right):
+    """Positions of matching keys in `left` and `right`, as an inner join.
+
+    Returns two aligned arrays of positions, ordered by the left position and
+    then the right position.
+    """
+
+    order = np.argsort(right, kind="stable")
+    lo = np.searchsorted(right[order], left, side="left")
+    hi = np.searchsorted(right[order], left, side="right")
+    n = hi - lo
+
+    left_positions = np.repeat(np.arange(len(left)), n)
+    offsets = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    right_positions = order[np.repeat(lo, n) + offsets]
+
+    return left_positions, right_positions
+
+
+def duplicated(keys):
+    """Whether each key repeats an earlier one, as `DataFrame.duplicated`."""
+
+    _, first = np.unique(keys, return_index=True)
+    mask = np.ones(len(keys), dtype=bool)
+    mask[first] = False
+
+    return mask
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from src.stats_enrichment import analytic
+
+
+@pytest.fixture
+def counts():
+    index = pd.MultiIndex.from_product(
+        [["nmd_target", "distal_nmd"], ["constrained", "unconstrained"]],
+        names=["region", "constraint"],
+    )
+    return pd.DataFrame(
+        {"gnomad_exp": [10.0, 30.0, 20.0, 20.0], "dnms_obs": [30, 20, 12, 28]},
+        index=index,
+    )
+
+
+@pytest.mark.parametrize("test", ["delta", "binomial", "g_test"])
+def test_null_at_observed_fold_change(counts, test):
+    fc = analytic.get_statistics(counts, test)["fc"]
+
+    for region, h0 in fc.items():
+        p = analytic.get_statistics(counts.loc[[region]], test, h0=h0)["p"]
+        assert p.iloc[0] == pytest.approx(1, abs=0.2)
+
+
+def test_g_test_h0(counts):
+    h0 = 2
+    df = analytic.get_statistics(counts, "g_test", h0=h0)
+    delta = analytic.get_statistics(counts, "delta", h0=h0)
+
+    wide = analytic.pivot_constraint(counts)
+    n = wide["obs_c"] + wide["obs_u"]
+    expected = n * analytic.fc_to_prob(h0, wide)
+    observed = np.stack([wide["obs_c"], wide["obs_u"]], axis=1)
+    expected = np.stack([expected, n - expected], axis=1)
+    g = 2 * (observed * np.log(observed / expected)).sum(axis=1)
+
+    np.testing.assert_allclose(df["p"], stats.chi2.sf(g, 1))
+    pd.testing.assert_frame_equal(
+        df[["fc_ci_lo", "fc_ci_hi"]], delta[["fc_ci_lo", "fc_ci_hi"]]
+    )
+    assert not np.allclose(df["p"], analytic.get_statistics(counts, "g_test")["p"])
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.stats_enrichment import bootstrap, dnms_enrichment
+
+_GROUPING = ["csq", "constraint"]
+
+
+@pytest.fixture
+def counts():
+    rng = np.random.default_rng(0)
+    n = 200
+
+    return pd.DataFrame(
+        {
+            "csq": rng.choice(["synonymous_variant", "truncating"], n),
+            "constraint": rng.choice(["constrained", "unconstrained"], n),
+            "n_exp": rng.poisson(20, n),
+            "n_dnms": rng.poisson(2, n),
+        }
+    )
+
+
+def test_checkpoint_matches_fresh_run(counts, tmp_path):
+    fc = bootstrap.bootstrap_fc(counts, _GROUPING, 300, seed=1)
+    path = tmp_path / "fc.npy"
+
+    for resamples in [100, 300, 500, 300]:
+        fc_checkpoint = bootstrap.bootstrap_fc_checkpoint(
+            counts, _GROUPING, resamples, path, seed=1
+        )
+
+        assert fc_checkpoint.shape[1] == resamples
+        if resamples == 300:
+            pd.testing.assert_frame_equal(fc_checkpoint, fc)
+
+    assert len(np.load(path)) == 500
+
+
+def test_checkpoint_statistics_match(counts, tmp_path):
+    kwargs = dict(bootstrap_samples=300, method="vectorised", seed=1)
+    fresh = dnms_enrichment.get_dnms_enrichment(counts, _GROUPING, **kwargs)
+    checkpoint = dnms_enrichment.get_dnms_enrichment(
+        counts, _GROUPING, checkpoint=tmp_path / "fc.npy", **kwargs
+    )
+
+    pd.testing.assert_series_equal(checkpoint["p"], fresh["p"])
+    pd.testing.assert_frame_equal(
+        checkpoint[["fc_ci_lo", "fc_ci_hi"]], fresh[["fc_ci_lo", "fc_ci_hi"]], rtol=1e-3
+    )
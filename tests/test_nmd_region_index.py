@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from src.merge_annotations import nmd_region_index
+
+
+def make_index():
+    df = pd.DataFrame(
+        {
+            "chr": ["1"] * 6,
+            "pos": [10, 11, 12, 20, 21, 22],
+            "transcript_id": ["T1"] * 6,
+            "nmd_definitive": ["nmd_target"] * 3 + ["distal_nmd"] * 3,
+        }
+    ).astype("category")
+    return nmd_region_index.compile_index(df.astype({"pos": np.int64}))
+
+
+def test_lookup_within_interval():
+    index = make_index()
+    regions = nmd_region_index.lookup(index, ["1", "1"], ["T1", "T1"], [10, 22])
+
+    assert list(regions) == ["nmd_target", "distal_nmd"]
+
+
+def test_lookup_past_interval_end():
+    index = make_index()
+    regions = nmd_region_index.lookup(index, ["1", "1"], ["T1", "T1"], [13, 23])
+
+    assert pd.isna(regions).all()
+
+
+def test_overlap_spanning_interval_start():
+    index = make_index()
+    regions = nmd_region_index.find_overlaps(index, ["1"], ["T1"], [15], [20])
+
+    assert list(regions) == ["distal_nmd"]
+
+
+def test_empty_index():
+    index = make_index()
+    empty = index._replace(
+        transcript=index.transcript[:0],
+        start=index.start[:0],
+        end=index.end[:0],
+        region=index.region[:0],
+    )
+    regions = nmd_region_index.lookup(empty, ["1"], ["T1"], [10])
+
+    assert pd.isna(regions).all()
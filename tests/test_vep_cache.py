@@ -0,0 +1,112 @@
+import stat
+import sys
+
+import pysam
+import pytest
+
+from src.annotate_dnms import vep_cache
+
+# Stub `vep` pipeline: logs the variants it is given, and writes the split
+# fields for pos % 3 consequences of each (none when pos is a multiple of 3).
+_STUB = f"""#!{sys.executable}
+import sys
+
+import pysam
+
+vcf_in = pysam.VariantFile(sys.argv[1])
+header = vcf_in.header
+for field in ["Consequence", "Feature", "SYMBOL"]:
+    header.info.add(field, 1, "String", field)
+
+with open("vep_calls.log", "a") as log, pysam.VariantFile(
+    sys.argv[2], "wz", header=header
+) as vcf_out:
+    for record in vcf_in:
+        log.write(f"{{record.chrom}}\\t{{record.pos}}\\n")
+        for i in range(record.pos % 3):
+            out = record.copy()
+            out.info["Consequence"] = f"csq_{{i}}"
+            out.info["Feature"] = f"ENST{{record.pos}}_{{i}}"
+            out.info["SYMBOL"] = "GENE"
+            vcf_out.write(out)
+"""
+
+_FIRST = [("chr1", 100), ("chr1", 101), ("chr1", 101), ("chr2", 50)]
+_SECOND = [("chr1", 100), ("chr1", 102), ("chr1", 103), ("chr1", 101), ("chr2", 50)]
+
+
+def write_vcf(path, sites):
+    header = pysam.VariantHeader()
+    for contig in ["chr1", "chr2"]:
+        header.contigs.add(contig, length=1000)
+    header.add_sample("proband")
+
+    with pysam.VariantFile(path, "wz", header=header) as vcf:
+        for i, (chrom, pos) in enumerate(sites):
+            vcf.write(
+                vcf.new_record(
+                    contig=chrom, start=pos - 1, alleles=("A", "G"), id=f"rec{i}"
+                )
+            )
+
+    return path
+
+
+def read_calls(path):
+    if not path.exists():
+        return []
+    return [tuple(l.split("\t")) for l in path.read_text().splitlines()]
+
+
+def read_output(path):
+    with pysam.VariantFile(path) as vcf:
+        return [(r.id, r.info["Feature"]) for r in vcf]
+
+
+def expected_output(sites):
+    return [
+        (f"rec{i}", f"ENST{pos}_{j}")
+        for i, (_, pos) in enumerate(sites)
+        for j in range(pos % 3)
+    ]
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    path = tmp_path / "vep"
+    path.write_text(_STUB)
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+
+    return [str(path)]
+
+
+def test_second_run_annotates_only_novel_variants(stub, tmp_path):
+    cache = tmp_path / "cache.tsv.gz"
+    calls = tmp_path / "vep_calls.log"
+
+    first_in = write_vcf(str(tmp_path / "first.vcf.gz"), _FIRST)
+    first_out = str(tmp_path / "first_vep.vcf.gz")
+    vep_cache.annotate_with_cache(first_in, first_out, cache, stub)
+
+    assert sorted(read_calls(calls)) == [
+        ("chr1", "100"),
+        ("chr1", "101"),
+        ("chr2", "50"),
+    ]
+    assert read_output(first_out) == expected_output(_FIRST)
+
+    calls.unlink()
+    second_in = write_vcf(str(tmp_path / "second.vcf.gz"), _SECOND)
+    second_out = str(tmp_path / "second_vep.vcf.gz")
+    vep_cache.annotate_with_cache(second_in, second_out, cache, stub)
+
+    assert sorted(read_calls(calls)) == [("chr1", "102"), ("chr1", "103")]
+    assert read_output(second_out) == expected_output(_SECOND)
+
+    calls.unlink()
+    vep_cache.annotate_with_cache(second_in, second_out, cache, stub)
+
+    assert read_calls(calls) == []
+    assert read_output(second_out) == expected_output(_SECOND)